@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+'''Measure the per-request cost of validating bodies against their Model.
+
+For a small and a larger document, time the extraction of a body parameter
+without validation, with the validator compiled once per Model (as Swaggery
+does), and with a validator built at each request (as `jsonschema.validate`
+does).
+
+Usage:
+    validation.py [--iterations=N]
+
+Options:
+    --iterations=N  Number of extractions per measure [default: 10000].
+'''
+
+import os
+import sys
+import json
+from timeit import timeit
+
+from docopt import docopt
+from jsonschema import validate
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from swaggery.keywords import *
+from swaggery.utils import ArgumentExtractor, decode_json
+
+
+class Point(Model):
+
+    '''A point in the plane.'''
+
+    schema = {
+        'type': 'object',
+        'properties': {
+            'x': {'type': 'number'},
+            'y': {'type': 'number'},
+            'label': {'type': 'string', 'maxLength': 32},
+        },
+        'required': ['x', 'y'],
+    }
+
+
+class Polygon(Model):
+
+    '''A labelled polygon.'''
+
+    schema = {
+        'type': 'object',
+        'properties': {
+            'name': {'type': 'string'},
+            'vertices': {
+                'type': 'array',
+                'items': Point.schema,
+                'minItems': 3,
+            },
+        },
+        'required': ['name', 'vertices'],
+    }
+
+
+def point(cls, request, body: (Ptypes.body, Point('A point'))):
+    pass
+
+
+def polygon(cls, request, body: (Ptypes.body, Polygon('A polygon'))):
+    pass
+
+
+def make_request(document):
+    '''Return a POST request carrying document as its JSON body.'''
+    builder = EnvironBuilder(data=json.dumps(document), method='POST',
+                             content_type='application/json')
+    request = Request(builder.get_environ())
+    request.data  # Read the body once, so that only decoding is measured
+    return request
+
+
+def main(iterations):
+    cases = (
+        ('point', point, Point, {'x': 1.5, 'y': -2, 'label': 'A'}),
+        ('polygon (100 vertices)', polygon, Polygon, {
+            'name': 'centagon',
+            'vertices': [{'x': n, 'y': -n} for n in range(100)]}),
+    )
+    row = '{:<24}{:>14}{:>14}{:>14}'
+    print(row.format('document', 'no validation', 'compiled', 'per request'))
+    for name, function, model, document in cases:
+        request = make_request(document)
+        plain = ArgumentExtractor(function)
+        validated = ArgumentExtractor(function, validate=True)
+        timings = (
+            timeit(lambda: plain(request, {}), number=iterations),
+            timeit(lambda: validated(request, {}), number=iterations),
+            timeit(lambda: validate(decode_json(request.data), model.schema),
+                   number=iterations),
+        )
+        print(row.format(name, *('{:.1f} us'.format(timing / iterations * 1e6)
+                                 for timing in timings)))
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    main(int(arguments['--iterations']))
@@ -54,7 +54,7 @@ class AlwaysWin(Resource):
             yield
         log.info('Finished always OK task {}'.format(task_id))
         msg = 'I am finally done with task {}!'.format(task_id)
-        Respond(200, msg)
+        return Response(200, msg)
 
 
 class AlwaysFail(Resource):
@@ -115,7 +115,6 @@ class Fibonacci(Resource):
                 yield last_two[1]
                 last_two = last_two[1], sum(last_two)
         log.info('Starting Fibonacci generation, max: {}'.format(limit))
-        limit = int(limit)
         Respond(200, fibonacci_generator())
 
 
@@ -17,13 +17,13 @@ class Vector(Model):
         'type': 'object',
         'properties': {
             'x': {
-                'type': 'float'
+                'type': 'number'
             },
             'y': {
-                'type': 'float'
+                'type': 'number'
             },
             'z': {
-                'type': 'float',
+                'type': 'number',
             }
         },
         'required': ['x', 'y']
@@ -53,7 +53,8 @@ class TwoNumbers(Resource):
     api = Calculator
     subpath = 'op/<operation>/<first>/<second>'
 
-    @operations('GET')
+    # Results only depend on the path, so they can be cached for a while
+    @operations('GET', cache={'ttl': 300, 'max_entries': 1024})
     def two_numbers(
             cls, request,
             operation: (Ptypes.path,
@@ -68,11 +69,6 @@ class TwoNumbers(Resource):
             (422, 'NaN')]:
         '''Any of the four arithmetic operation on two numbers.'''
         log.info('Performing {} on {} and {}'.format(operation, first, second))
-        try:
-            first = float(first)
-            second = float(second)
-        except ValueError:
-            Respond(400)
         if operation == 'add':
             Respond(200, first + second)
         elif operation == 'sub':
@@ -46,9 +46,8 @@ class Clock(Resource):
         ]:
         '''A streaming Lord Vetinari clock...'''
         try:
-            length = int(length)
             style = cls._styles[style]
-        except (ValueError, KeyError):
+        except KeyError:
             Respond(400)
         def vetinari_clock():
             start = time()
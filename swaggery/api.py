@@ -19,11 +19,17 @@ generated with swagger tools.
 import re
 import json
 import inspect
+from types import MappingProxyType
+from collections import OrderedDict
 
 from werkzeug.routing import Rule
+from werkzeug.exceptions import HTTPException
 
 from . import utils
+from . import executors
 from .logger import log
+from .caching import SingleFlight, make_response_cache
+from .limits import Bulkhead, enforce_deadline, get_timeout
 from .flowcontrol import Respond
 from .responses import BadResponse, GoodResponse
 
@@ -41,12 +47,15 @@ class Api(object, metaclass=utils.RegisterLeafClasses):
       - version: the current version of the api (string)
       - path: the path frgament common to all resources
       - description: a short description of what the API is all about
+      - priority: the precedence of its requests under overload (default: 0,
+                  see `limits.LoadShedder`).
     '''
 
     swagger_version = __SWAGGER_VERSION__
 
     __description = None
     private = False
+    priority = 0
 
     @classmethod
     def get_swagger_fragment(cls):
@@ -73,6 +82,11 @@ class Resource(object, metaclass=utils.RegisterLeafClasses):
                  api URL.  This can be omitted or set to an empty string if the
                  resource is the root of the API.
       - description: a short description of what the resource does.
+      - compress: whether responses can be compressed (default: True).  Set
+                  it to False for payloads that do not compress well.
+      - max_concurrency, max_queue: the concurrent calls to the operations of
+                  the resource, and the calls waiting for their turn, beyond
+                  which calls are rejected (default: None, no limits).
 
     Classmethods for any of the HTTP methods (get, post, put...)
     '''
@@ -80,7 +94,11 @@ class Resource(object, metaclass=utils.RegisterLeafClasses):
     api = None
     subpath = None
     private = False
+    compress = True
+    max_concurrency = None
+    max_queue = 0
 
+    __bulkhead = None
     __callbacks = None
     __description = None
     __endpoint_path = None
@@ -125,17 +143,19 @@ class Resource(object, metaclass=utils.RegisterLeafClasses):
         for http, callback in cls.implemented_methods.items():
             # Parse docstring
             summary, notes = utils.parse_docstring(callback)
-            # Parse return annotations
-            responses = utils.parse_return_annotation(callback)
-            ok_result_model = responses[200]['responseModel']
+            # Use the return annotations, as precompiled by `operations`
+            table = callback.response_table
+            responses = [
+                {'code': code, 'message': message, 'responseModel': model}
+                for code, (message, model, _) in table.items()]
             operations.append({
                 'method': http,
                 'nickname': callback.__name__,
-                'type': ok_result_model,
+                'type': table[200][1],
                 'parameters': cls.parse_signature(callback),
                 'summary': summary.strip(),
                 'notes': notes.strip(),
-                'responseMessages': list(responses.values())
+                'responseMessages': responses
             })
         return operations
 
@@ -144,11 +164,36 @@ class Resource(object, metaclass=utils.RegisterLeafClasses):
         '''A generator of (rule, callback) tuples.'''
         for callback in cls.callbacks:
             ep_name = '{}.{}'.format(cls.api.__name__, callback.__name__)
-            yield (Rule(cls.endpoint_path,
+            yield (Rule(utils.type_rule(cls.endpoint_path, callback),
                         endpoint=ep_name,
                         methods=callback.swagger_ops),
                    callback)
 
+    @classmethod
+    def invalidate_cache(cls, *operations, **params):
+        '''Discard the cached responses of the operations of the resource.
+
+        If the names of some `operations` are given, only their caches are
+        affected.  If `params` are given, only the responses to calls with
+        those parameter values are discarded.  Return the number of discarded
+        responses.
+        '''
+        discarded = 0
+        for callback in cls.callbacks:
+            if callback.cache is None:
+                continue
+            if operations and callback.__name__ not in operations:
+                continue
+            discarded += callback.cache.invalidate(**params)
+        return discarded
+
+    @utils.classproperty
+    def bulkhead(cls):
+        '''The bulkhead shared by the operations of the resource (or None).'''
+        if cls.__bulkhead is None and cls.max_concurrency is not None:
+            cls.__bulkhead = Bulkhead(cls.max_concurrency, cls.max_queue)
+        return cls.__bulkhead
+
     @utils.classproperty
     def description(cls):
         '''A textual description of the resource.'''
@@ -194,7 +239,36 @@ class Resource(object, metaclass=utils.RegisterLeafClasses):
         return cls.__implemented_methods
 
 
-def operations(*operations):
+def compile_response_table(method):
+    '''Return an immutable {code: (message, model, exception)} mapping.
+
+    The mapping is computed from the return annotation of `method`.  `model`
+    is the swagger name of the response model, while `exception` is the
+    HTTPException class to raise for error codes (None for all other codes).
+    Malformed annotations result in an empty table (the checker reports them).
+    '''
+    table = OrderedDict()
+    try:
+        responses = utils.parse_return_annotation(method)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        responses = {}
+    for code, info in responses.items():
+        if not isinstance(code, int):
+            return MappingProxyType(OrderedDict())
+        exception = None
+        if code >= 400:
+            try:
+                exception = CODES_TO_EXCEPTIONS[code]
+            except KeyError:  # No werkzeug exception for this code
+                name = 'HTTPError{}'.format(code)
+                exception = type(name, (HTTPException, ), {'code': code})
+        table[code] = (info['message'], info['responseModel'], exception)
+    return MappingProxyType(table)
+
+
+def operations(*operations, cache=None, weight=1, executor=None,
+               max_concurrency=None, max_queue=0, deadline=None,
+               coalesce=False, max_body_size=None, stream_body=False):
     '''Decorator for marking Resource methods as HTTP operations.
 
     This decorator does a number of different things:
@@ -202,23 +276,87 @@ def operations(*operations):
           method, so as to be "transparent" with regards to introspection.
         - It tranform the method so as to make it a classmethod.
         - It invokes the method within a try-except condition, so as to
-          intercept and populate the Fail(<code>) conditions.'''
+          intercept and populate the Fail(<code>) conditions.
+        - It returns the successful Respond/Response to the caller (rather
+          than re-raising it), so as to limit the exception unwinding.
+        - It attaches a response cache to the method, if `cache` is given
+          (see `caching.make_response_cache` for the accepted values).
+        - It records the scheduling `weight` of the method (see the
+          `scheduler` module).
+        - It runs the method in a thread or process pool, if `executor` is
+          given (see the `executors` module).
+        - It limits the concurrent calls to the method, if `max_concurrency`
+          is given (see the `limits` module).
+        - It cancels the method once past its `deadline` (in seconds, which
+          requests can shorten, see the `limits` module).
+        - It coalesces concurrent identical GET requests into a single call,
+          if `coalesce` is True (see the `caching` module).
+        - It records the `max_body_size` of the requests to the method, if
+          given (see the `limits` module).
+        - It hands the body parameter to the method as an iterator over the
+          items of the body, parsed incrementally, if `stream_body` is True
+          (see the `streaming` module).'''
     def decorator(method):
         def wrapper(cls, request, start_response, **kwargs):
-            result_cache = []
+            if flights is not None and request.method in ('GET', 'HEAD'):
+                key = flights.make_key(cls, kwargs)
+                coroutine = flights.run(
+                    key, lambda: invoke(cls, request, kwargs))
+            else:
+                coroutine = invoke(cls, request, kwargs)
+            timeout = get_timeout(request, deadline)
+            if timeout is not None:
+                coroutine = enforce_deadline(coroutine, timeout)
+            return (yield from coroutine)
+
+        def invoke(cls, request, kwargs):
+            guard = bulkhead or getattr(cls, 'bulkhead', None)
+            if guard is not None:
+                yield from guard.enter()
             try:
-                yield from method(cls, request, **kwargs)
+                if executor is None:
+                    result = method(cls, request, **kwargs)
+                    if inspect.isgenerator(result):
+                        result = yield from result
+                else:
+                    result = yield from executors.run_operation(
+                        executor, cls, method, request, kwargs)
             except Respond as e:
-                # Inject messages as taken from signature
-                status = e.status
-                msg = utils.parse_return_annotation(method)[status]['message']
-                if status / 100 == 2:  # All 2xx HTTP codes
-                    e.description = msg
-                    raise e
-                else:  # HTTP Errors --> use werkzeug exceptions
-                    raise CODES_TO_EXCEPTIONS[status](msg)
+                result = e
+            finally:
+                if guard is not None:
+                    guard.leave()
+            if result is None:
+                return result
+            # Inject messages as taken from signature
+            if result.status == 304:  # See `flowcontrol.check_etag`
+                msg, exception = 'Not Modified', None
+            else:
+                msg, _, exception = response_table[result.status]
+            if exception is None:  # Non-error HTTP codes
+                result.description = msg
+                result.compress = getattr(cls, 'compress', True)
+                return result
+            else:  # HTTP Errors --> use werkzeug exceptions
+                raise exception(msg)
+        if executor is not None and executor not in executors.EXECUTORS:
+            msg = 'Executor "{}" is not available'
+            raise ValueError(msg.format(executor))
+        if stream_body and executor == 'process':
+            msg = 'Streamed bodies cannot be sent to a process pool'
+            raise ValueError(msg)
+        if deadline is not None and deadline <= 0:
+            raise ValueError('The deadline must be a positive number')
+        flights = SingleFlight() if coalesce else None
+        bulkhead = None
+        if max_concurrency is not None:
+            bulkhead = Bulkhead(max_concurrency, max_queue)
+        response_table = compile_response_table(method)
         # Add operation-specific attributes to the method.
         method.swagger_ops = operations
+        method.response_table = response_table
+        method.cache = make_response_cache(cache) if cache else None
+        method.weight = weight
         method.signature = inspect.signature(method)
         method.source = inspect.getsource(method)
         method.path_vars = utils.extract_pathvars(method)
@@ -230,5 +368,14 @@ def operations(*operations):
         wrapper.signature = method.signature
         wrapper.source = method.source
         wrapper.path_vars = method.path_vars
+        wrapper.response_table = method.response_table
+        wrapper.cache = method.cache
+        wrapper.weight = method.weight
+        wrapper.method = method
+        wrapper.bulkhead = bulkhead
+        wrapper.deadline = deadline
+        wrapper.flights = flights
+        wrapper.max_body_size = max_body_size
+        wrapper.stream_body = stream_body
         return classmethod(wrapper)
     return decorator
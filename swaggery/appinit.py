@@ -4,6 +4,13 @@ import logging
 import configparser
 
 from swaggery.application import Swaggery
+from swaggery.responses import (
+    STREAM_CHUNK_SIZE,
+    STREAM_FLUSH_INTERVAL,
+    COMPRESSION_THRESHOLD,
+)
+from swaggery.scheduler import DEFAULT_BUDGET
+from swaggery.limits import SHEDDING_INTERVAL
 from swaggery.logger import log
 
 
@@ -17,12 +24,67 @@ def init():
     api_dirs = list(config['apis'])
     do_checks = config.get('application',
                            'disable_boot_checks').lower() == 'false'
+    engine = config.get('application', 'engine', fallback='wsgi')
+    router = config.get('application', 'router', fallback='werkzeug')
+    route_cache_size = config.getint('application', 'route_cache_size',
+                                     fallback=0)
+    json_profile = config.get('application', 'json_profile',
+                              fallback='compact')
+    stream_chunk_size = config.getint('application', 'stream_chunk_size',
+                                      fallback=STREAM_CHUNK_SIZE)
+    stream_flush_interval = config.getfloat(
+        'application', 'stream_flush_interval',
+        fallback=STREAM_FLUSH_INTERVAL)
+    compression_threshold = config.get('application', 'compression_threshold',
+                                       fallback=str(COMPRESSION_THRESHOLD))
+    if compression_threshold.lower() == 'off':
+        compression_threshold = None
+    else:
+        compression_threshold = int(compression_threshold)
+    scheduler = config.get('application', 'scheduler', fallback='off')
+    if scheduler.lower() == 'off':
+        scheduler = None
+    scheduler_budget = config.getfloat('application', 'scheduler_budget',
+                                       fallback=DEFAULT_BUDGET)
+    # Zero means: default size of the pool
+    thread_workers = config.getint('application', 'thread_workers',
+                                   fallback=0) or None
+    process_workers = config.getint('application', 'process_workers',
+                                    fallback=0) or None
+    shedding_target = config.get('application', 'shedding_target',
+                                 fallback='off')
+    if shedding_target.lower() == 'off':
+        shedding_target = None
+    else:
+        shedding_target = float(shedding_target)
+    shedding_interval = config.getfloat('application', 'shedding_interval',
+                                        fallback=SHEDDING_INTERVAL)
+    validate_requests = config.getboolean('application', 'validate_requests',
+                                          fallback=False)
+    validate_responses = config.getboolean(
+        'application', 'validate_responses', fallback=False)
+    # Zero means: no limit
+    max_body_size = config.getint('application', 'max_body_size',
+                                  fallback=0) or None
     # Set logging level
     log.setLevel(getattr(logging, log_level))
     log.debug('Log level set to {}'.format(log_level))
     # Bootstrap application
     log.debug('Exploring directories: {}'.format(api_dirs))
-    application = Swaggery(api_dirs=api_dirs, do_checks=do_checks)
+    application_class = Swaggery
+    if engine == 'asgi':
+        from swaggery.asgi import AsgiSwaggery as application_class
+    application = application_class(
+        api_dirs=api_dirs, do_checks=do_checks, router=router,
+        route_cache_size=route_cache_size, json_profile=json_profile,
+        stream_chunk_size=stream_chunk_size,
+        stream_flush_interval=stream_flush_interval,
+        compression_threshold=compression_threshold,
+        scheduler=scheduler, scheduler_budget=scheduler_budget,
+        thread_workers=thread_workers, process_workers=process_workers,
+        shedding_target=shedding_target, shedding_interval=shedding_interval,
+        validate_requests=validate_requests,
+        validate_responses=validate_responses, max_body_size=max_body_size)
     return application
 
 application = init()
@@ -1,17 +1,31 @@
 
 import os
 import sys
+import inspect
 import pkgutil
+from time import time
 from importlib import import_module
 
-from werkzeug.routing import Map
-from werkzeug.wrappers import Request, Response
+from werkzeug.wrappers import Request
 from werkzeug.exceptions import HTTPException
 
 from .api import Resource
-from .utils import inject_extra_args
+from .models import Model
+from .utils import ArgumentExtractor, LRUCache, JSON_ENCODERS
 from .logger import log
-from .responses import GoodResponse, BadResponse
+from .routing import ROUTERS
+from .scheduler import Scheduler, DEFAULT_BUDGET
+from .limits import BodyLimiter, LoadShedder, SHEDDING_INTERVAL, get_arrival
+from . import executors
+from .responses import (
+    GoodResponse,
+    BadResponse,
+    STREAM_CHUNK_SIZE,
+    STREAM_FLUSH_INTERVAL,
+    COMPRESSION_THRESHOLD,
+    negotiate_encoding,
+    is_raw_payload,
+)
 from .flowcontrol import Respond
 from .checker import main as check_and_load
 
@@ -26,7 +40,46 @@ class Swaggery(object):
 
     '''The main Application object.'''
 
-    def __init__(self, api_dirs, do_checks=True):
+    def __init__(self, api_dirs, do_checks=True, router='werkzeug',
+                 route_cache_size=0, json_profile='compact',
+                 stream_chunk_size=STREAM_CHUNK_SIZE,
+                 stream_flush_interval=STREAM_FLUSH_INTERVAL,
+                 compression_threshold=COMPRESSION_THRESHOLD,
+                 scheduler=None, scheduler_budget=DEFAULT_BUDGET,
+                 thread_workers=None, process_workers=None,
+                 shedding_target=None, shedding_interval=SHEDDING_INTERVAL,
+                 validate_requests=False, validate_responses=False,
+                 max_body_size=None):
+        if json_profile not in JSON_ENCODERS:
+            msg = 'JSON profile "{}" is not available (choose among: {})'
+            raise ValueError(msg.format(json_profile, sorted(JSON_ENCODERS)))
+        self.json_profile = json_profile
+        # Options passed to all responses (on top of the per-request ones)
+        self.response_options = {
+            'chunk_size': stream_chunk_size,
+            'flush_interval': stream_flush_interval,
+            'compression_threshold': compression_threshold,
+        }
+        self.router_engine = router
+        # Validation of bodies and (a debugging aid) of response payloads
+        self.validate_requests = validate_requests
+        self.validate_responses = validate_responses
+        self.response_validators = {}
+        self.route_cache = None
+        if route_cache_size:
+            self.route_cache = LRUCache(route_cache_size)
+        self.response_caches = {}
+        self.bulkheads = {}
+        self.flights = {}
+        self.scheduler = None
+        if scheduler is not None:
+            self.scheduler = Scheduler(scheduler, scheduler_budget)
+        self.body_limiter = BodyLimiter(max_body_size)
+        self.max_read_size = max_body_size
+        self.shedder = None
+        if shedding_target is not None:
+            self.shedder = LoadShedder(shedding_target, shedding_interval)
+        executors.configure(thread_workers, process_workers)
         self._register_resources(api_dirs, do_checks)
         if not do_checks:
             log.warning('Skipping sanity checks for all APIs')
@@ -49,41 +102,218 @@ class Swaggery(object):
         '''Mount all registered resources onto the application.'''
         rules = []
         self.callback_map = {}
+        self.extractor_map = {}
+        self.response_caches = {}
+        self.bulkheads = {}
+        self.flights = {}
+        self.priorities = {}
+        self.response_validators = {}
+        body_sizes = []
         for ep in Resource:
+            if ep.bulkhead is not None:
+                name = '{}.{}'.format(ep.api.__name__, ep.__name__)
+                self.bulkheads[name] = ep.bulkhead
             for rule, callback in ep.get_routing_tuples():
                 log.debug('Path "{}" mapped to "{}"'.format(
                     rule.rule, rule.endpoint))
                 rules.append(rule)
                 self.callback_map[rule.endpoint] = callback
-        self.url_map = Map(rules)
+                self.extractor_map[rule.endpoint] = ArgumentExtractor(
+                    callback, self.validate_requests)
+                if self.validate_responses:
+                    self.response_validators[callback] = get_validators(
+                        callback)
+                self.priorities[rule.endpoint] = getattr(ep.api, 'priority', 0)
+                if getattr(callback, 'cache', None) is not None:
+                    self.response_caches[rule.endpoint] = callback.cache
+                if getattr(callback, 'bulkhead', None) is not None:
+                    self.bulkheads[rule.endpoint] = callback.bulkhead
+                if getattr(callback, 'flights', None) is not None:
+                    self.flights[rule.endpoint] = callback.flights
+                if getattr(callback, 'max_body_size', None) is not None:
+                    body_sizes.append(callback.max_body_size)
+        # The largest body that any operation accepts (None if unlimited)
+        max_size = self.body_limiter.max_size
+        if max_size is not None:
+            self.max_read_size = max([max_size] + body_sizes)
+        elif body_sizes and len(body_sizes) == len(self.callback_map):
+            self.max_read_size = max(body_sizes)
+        else:
+            self.max_read_size = None
+        log.debug('Routing with the "{}" engine'.format(self.router_engine))
+        self.router = ROUTERS[self.router_engine](rules)
+        if self.route_cache is not None:
+            self.route_cache.clear()
+
+    def get_read_limit(self, request):
+        '''Return how many bytes of the body of request are worth reading.
+
+        Servers buffering the bodies before dispatching (e.g.: ASGI ones) need
+        to read no more than one byte past the limit: this is the limit of the
+        operation the request is routed to (or the global one), or, for the
+        requests that cannot be routed, the largest limit.  None means that
+        the body is not limited.
+        '''
+        try:
+            endpoint, _ = self.router.match(request)
+        except HTTPException:
+            return self.max_read_size
+        callback = self.callback_map.get(endpoint)
+        max_size = getattr(callback, 'max_body_size', None)
+        return self.body_limiter.max_size if max_size is None else max_size
+
+    def _match(self, request):
+        '''Route the request, going through the route cache if enabled.'''
+        cache = self.route_cache
+        if cache is None:
+            return self.router.match(request)
+        key = (request.method, request.path)
+        static_routes = self.router.static_routes
+        if key in static_routes:  # Already resolved in O(1), so not cached
+            return static_routes[key], {}
+        match = cache.get(key)
+        if match is None:
+            endpoint, kwargs = self.router.match(request)
+            if not kwargs:  # Static routes are resolved in O(1) already
+                return endpoint, kwargs
+            match = (endpoint, kwargs.copy())
+            cache.put(key, match)
+        endpoint, kwargs = match
+        # The kwargs are extended with the extra arguments, hence the copy
+        return endpoint, kwargs.copy()
+
+    def _get_json_profile(self, request):
+        '''Return the JSON profile for the request (`?pretty=1` overrides).'''
+        pretty = request.args.get('pretty')
+        if pretty is None:
+            return self.json_profile
+        return 'compact' if pretty in ('0', 'false') else 'pretty'
 
-    def _get_coroutine(self, request, start_response):
-        '''Try to dispapch the request and get the matching coroutine.'''
-        adapter = self.url_map.bind_to_environ(request.environ)
-        resource, kwargs = adapter.match()
+    def get_stats(self):
+        '''Return a dictionary with the usage statistics of the application.'''
+        stats = {}
+        if self.route_cache is not None:
+            stats['route_cache'] = self.route_cache.stats
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats
+        if self.shedder is not None:
+            stats['shedder'] = self.shedder.stats
+        if self.body_limiter.checked:
+            stats['bodies'] = self.body_limiter.stats
+        pools = executors.get_stats()
+        if pools:
+            stats['executors'] = pools
+        if self.response_caches:
+            stats['response_caches'] = {
+                endpoint: cache.stats
+                for endpoint, cache in self.response_caches.items()}
+        if self.bulkheads:
+            stats['bulkheads'] = {
+                name: bulkhead.stats
+                for name, bulkhead in self.bulkheads.items()}
+        if self.flights:
+            stats['coalescing'] = {
+                endpoint: flights.stats
+                for endpoint, flights in self.flights.items()}
+        return stats
+
+    def _dispatch(self, request):
+        '''Try to dispatch the request, return the callback and its kwargs.'''
+        resource, kwargs = self._match(request)
+        if self.shedder is not None:
+            self.shedder.admit(self.priorities.get(resource, 0))
         callback = self.callback_map[resource]
-        inject_extra_args(callback, request, kwargs)
-        return callback(request, start_response, **kwargs)
+        self.body_limiter.check(
+            request, getattr(callback, 'max_body_size', None))
+        extract = self.extractor_map[resource]
+        if extract:
+            extract(request, kwargs)
+        return callback, kwargs
+
+    def _validate_response(self, callback, result):
+        '''Raise ValidationError if the payload does not match its model.
+
+        Streamed and raw payloads are not validated.
+        '''
+        if result is None:
+            return
+        validators = self.response_validators.get(callback, {})
+        validator = validators.get(result.status)
+        payload = result.payload
+        if validator is None or inspect.isgenerator(payload):
+            return
+        if is_raw_payload(payload):
+            return
+        validator.validate(payload)
+
+    def _get_cache_key(self, request, callback, kwargs, options):
+        '''Return the key of the response in the callback cache (or None).'''
+        cache = getattr(callback, 'cache', None)
+        if cache is None or request.method not in ('GET', 'HEAD'):
+            return None
+        variant = (options['json_profile'], negotiate_encoding(request))
+        return cache.make_key(kwargs, variant)
 
     def __call__(self, environ, start_response):
         request = Request(environ)
+        if self.shedder is not None:
+            arrival = get_arrival(request)
         url = request.url
         method = request.method
+        options = dict(self.response_options,
+                       json_profile=self._get_json_profile(request))
         # CORS pre-flight emit an OPTIONS request (at least on Swagger-UI, so
         # we default an option request to Positive response)
+        dispatched = False
         try:
             log.debug('Attempting to dispatch {} {}'.format(method, url))
-            coroutine = self._get_coroutine(request, start_response)
+            callback, kwargs = self._dispatch(request)
+            dispatched = True
             log.debug('Dispatching of {} SUCCEDED!'.format(url))
-            yield from coroutine
-        except Respond as e:  # Only good responses are still of this class
+            key = self._get_cache_key(request, callback, kwargs, options)
+            response = None if key is None else callback.cache.get(key)
+            if response is None:
+                coroutine = callback(request, start_response, **kwargs)
+                if self.scheduler is not None:
+                    weight = getattr(callback, 'weight', 1)
+                    coroutine = self.scheduler.run(coroutine, weight)
+                result = yield from coroutine
+                if self.validate_responses:
+                    self._validate_response(callback, result)
+                response = GoodResponse(request, result, **options)
+                # Only successful, complete (not streamed) responses are cached
+                ok = response.status_code == 200
+                if key is not None and ok and response.data is not None:
+                    callback.cache.put(key, response)
+            else:
+                log.debug('Serving {} from the response cache'.format(url))
+                etag = response.etag
+                if etag and request.if_none_match.contains_weak(etag):
+                    response = response.not_modified()
+        except Respond as e:  # Only from callbacks not using `operations`
             log.debug('Intercepted a Respond exception')
-            response = GoodResponse(request, e)
+            response = GoodResponse(request, e, **options)
         except HTTPException as e:
             log.debug('Intercepted an HTTPException')
-            response = BadResponse(request, e)
+            response = BadResponse(request, e, **options)
         except Exception as e:
             msg = 'Intercepted an Exception of type "{}". Message was: "{}"'
             log.error(msg.format(e.__class__.__name__, e))
-            response = BadResponse(request, e)
+            response = BadResponse(request, e, **options)
+        # Requests rejected before running (e.g.: shed ones) are answered at
+        # once: their sojourn would wrongly tell the shedder load is over
+        if self.shedder is not None and dispatched:
+            self.shedder.record(time() - arrival)
         yield from response.async(environ, start_response)
+
+
+def get_validators(callback):
+    '''Return the {status: validator} mapping of the responses of callback.'''
+    validators = {}
+    table = getattr(callback, 'response_table', {})
+    for code, (_, model_name, _) in table.items():
+        model = Model.name_to_cls.get(model_name)
+        validator = None if model is None else model.validator
+        if validator is not None:
+            validators[code] = validator
+    return validators
@@ -0,0 +1,146 @@
+'''Run Swaggery APIs on an asyncio loop, behind an ASGI server.
+
+`AsgiSwaggery` is a drop-in replacement of the WSGI `Swaggery` application:
+APIs, resources and operations are the same, and are driven by the very same
+coroutine that uWSGI drives, but within an asyncio task.  Within the
+coroutine:
+    - bare `yield`s relinquish control to the loop for one iteration (as uWSGI
+      async cores do);
+    - futures are awaited by the loop, so that operations can
+      `yield from asyncio.sleep(...)`, sockets, subprocesses, etc...
+    - body chunks are sent as ASGI `http.response.body` messages, so that
+      generator payloads are streamed as they are produced.
+
+Operations awaiting asyncio futures can only be served by this application.
+Request bodies are read in full before the request is dispatched, but no
+further than the body size limit of the operation the request is routed to:
+bodies streamed with `stream_body` (see the `streaming` module) are then parsed
+from memory, not in bounded memory.
+'''
+
+import io
+import sys
+import asyncio
+
+from werkzeug.wrappers import Request
+
+from .application import Swaggery
+from .logger import log
+
+
+class AsgiSwaggery(Swaggery):
+
+    '''The ASGI application object.'''
+
+    @asyncio.coroutine
+    def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            yield from self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            msg = 'Unsupported ASGI scope type: "{}"'
+            raise ValueError(msg.format(scope['type']))
+        # Routed ahead of reading, so that the read stops past the limit of
+        # the operation
+        limit = self.get_read_limit(Request(build_environ(scope, b'')))
+        body = yield from read_body(receive, limit)
+        start = []
+
+        def start_response(status, headers, exc_info=None):
+            start.append({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'),
+                             value.encode('latin-1'))
+                            for name, value in headers],
+            })
+        environ = build_environ(scope, body)
+        # The WSGI coroutine is driven by hand, relaying bare yields and
+        # futures to the loop, and the body chunks to the server.
+        for value in super().__call__(environ, start_response):
+            if value is None:
+                yield
+            elif isinstance(value, asyncio.Future):
+                yield value
+            else:
+                if start:
+                    yield from send(start.pop())
+                if value:
+                    yield from send({'type': 'http.response.body',
+                                     'body': value, 'more_body': True})
+        if start:
+            yield from send(start.pop())
+        yield from send({'type': 'http.response.body', 'body': b''})
+
+    @asyncio.coroutine
+    def lifespan(self, receive, send):
+        '''Acknowledge the startup and shutdown of the server.'''
+        while True:
+            message = yield from receive()
+            if message['type'] == 'lifespan.startup':
+                log.debug('ASGI server started')
+                yield from send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                log.debug('ASGI server shutting down')
+                yield from send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+@asyncio.coroutine
+def read_body(receive, limit=None):
+    '''Return the full body of the request.
+
+    Reading stops past `limit` bytes (if not None): the truncated body is then
+    rejected by the application, because of its length.
+    '''
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = yield from receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        chunks.append(chunk)
+        size += len(chunk)
+        if limit is not None and size > limit:
+            break
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+def build_environ(scope, body):
+    '''Return the WSGI environ for an ASGI HTTP scope and its body.'''
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings are bytes decoded as latin-1, ASGI ones as UTF-8
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue  # The body is already buffered
+        if name != 'CONTENT_TYPE':
+            name = 'HTTP_' + name
+        if name in environ:
+            value = '{},{}'.format(environ[name], value)
+        environ[name] = value
+    return environ
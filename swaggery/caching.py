@@ -0,0 +1,250 @@
+'''Caching of the responses of the operations.
+
+Operations declared with `@operations(..., cache=...)` get their own
+`ResponseCache`, storing the final (encoded) responses to GET requests.  Hits
+are served by the application without running the operation at all.
+
+Operations declared with `@operations(..., coalesce=True)` get their own
+`SingleFlight` instead (or as well): identical GET requests arriving while the
+operation is running for a first one wait for it (yielding cooperatively), and
+then share its outcome, rather than running the operation again.
+'''
+
+import inspect
+from time import monotonic
+from itertools import tee
+
+from .flowcontrol import Response
+from .utils import LRUCache
+
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+class ResponseCache(LRUCache):
+
+    '''A cache of responses, bounded in number of entries, bytes and age.
+
+    Responses are stored under a `(params, variant)` key, where `params` are
+    the (name, value) pairs of the key parameters of the operation (all of its
+    arguments, if `key` is None) and `variant` identifies the negotiated
+    representation of the response.  Entries older than `ttl` seconds (if not
+    None) are discarded when looked up.
+    '''
+
+    def __init__(self, ttl=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=None, key=None):
+        super().__init__(max_entries)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.key = None if key is None else tuple(key)
+        self.bytes = 0
+        self.expirations = self.invalidations = 0
+
+    def make_key(self, kwargs, variant):
+        '''Return the key for the arguments of a call (None if uncacheable).'''
+        names = sorted(kwargs) if self.key is None else self.key
+        params = tuple((name, kwargs.get(name)) for name in names)
+        try:
+            hash(params)
+        except TypeError:  # Bodies, for example, are decoded as dictionaries
+            return None
+        return params, variant
+
+    def get(self, key, default=None):
+        '''Return the response for key, if it is cached and fresh.'''
+        try:
+            expires, response = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires is not None and expires <= monotonic():
+            self.discard(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def put(self, key, response):
+        '''Store response under key, evicting the oldest ones if needed.'''
+        size = len(response.data)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.discard(key)
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        self._data[key] = (expires, response)
+        self.bytes += size
+        max_bytes = self.max_bytes
+        while len(self._data) > self.maxsize or (
+                max_bytes is not None and self.bytes > max_bytes):
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.bytes -= len(evicted.data)
+            self.evictions += 1
+
+    def discard(self, key):
+        '''Remove the entry for key, if present.'''
+        try:
+            _, response = self._data.pop(key)
+        except KeyError:
+            return
+        self.bytes -= len(response.data)
+
+    def clear(self):
+        '''Discard all the entries (statistics are preserved).'''
+        super().clear()
+        self.bytes = 0
+
+    def invalidate(self, **params):
+        '''Discard the entries whose key parameters match `params`.
+
+        All entries are discarded if no parameters are given.  Return the
+        number of discarded entries.
+        '''
+        if params:
+            params = set(params.items())
+            keys = [key for key in self._data if params <= set(key[0])]
+        else:
+            keys = list(self._data)
+        for key in keys:
+            self.discard(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the cache.'''
+        stats = super().stats
+        stats.update({
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        })
+        return stats
+
+
+def make_response_cache(options):
+    '''Return a ResponseCache from the `cache` option of an operation.
+
+    The option can be True (for the default settings), a dictionary of keyword
+    arguments for ResponseCache, or a ResponseCache instance.
+    '''
+    if isinstance(options, ResponseCache):
+        return options
+    if options is True:
+        options = {}
+    return ResponseCache(**options)
+
+
+class Flight(object):
+
+    '''An in-flight execution of an operation, and its shareable outcome.'''
+
+    def __init__(self):
+        self.done = False
+        self.error = None
+        self.results = None  # One per call, if the outcome can be shared
+        self.followers = 0
+
+    def settle(self, result):
+        '''Split the result of the operation among the leader and followers.
+
+        Generator payloads are fanned out (each call gets its own iterator over
+        the same items, which are produced once), but files cannot be shared,
+        nor can "304 Not Modified" results (which depend on the request).
+        '''
+        calls = self.followers + 1
+        if result is None:
+            self.results = [None] * calls
+            return
+        payload = result.payload
+        if hasattr(payload, 'read') or result.status == 304:
+            return
+        if inspect.isgenerator(payload):
+            payloads = [(item for item in branch)
+                        for branch in tee(payload, calls)]
+        else:
+            payloads = [payload] * calls
+        self.results = [share(result, payload) for payload in payloads]
+
+
+class SingleFlight(object):
+
+    '''Coalesce concurrent identical calls into a single execution.'''
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = self.followers = self.shared = 0
+
+    def make_key(self, cls, kwargs):
+        '''Return the key for the arguments of a call (None if unhashable).'''
+        key = (cls, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def run(self, key, factory):
+        '''Run the coroutine returned by `factory` (use with `yield from`).
+
+        If a call with the same `key` is already in flight, wait for it and
+        share its outcome instead.  If the outcome cannot be shared (or the
+        call has been abandoned), the coroutine is run after all.
+        '''
+        if key is None:
+            return (yield from factory())
+        flight = self.flights.get(key)
+        if flight is None:
+            return (yield from self.lead(key, factory()))
+        self.followers += 1
+        flight.followers += 1
+        try:
+            while not flight.done:
+                yield
+        except BaseException:  # Abandoned (e.g.: timed out or disconnected)
+            flight.followers -= 1  # Else settle() would fan out to it too
+            raise
+        if flight.error is not None:
+            self.shared += 1
+            raise flight.error
+        if flight.results is None:
+            return (yield from self.run(key, factory))
+        self.shared += 1
+        return flight.results.pop()
+
+    def lead(self, key, coroutine):
+        '''Run the coroutine on behalf of all the calls with the same key.'''
+        self.leaders += 1
+        flight = self.flights[key] = Flight()
+        try:
+            result = yield from coroutine
+        except Exception as e:  # Errors are shared, aborts are not
+            flight.error = e
+            raise
+        else:
+            flight.settle(result)
+        finally:
+            del self.flights[key]
+            flight.done = True
+        return result if flight.results is None else flight.results.pop()
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the coalescing.'''
+        return {
+            'in_flight': len(self.flights),
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'shared': self.shared,
+        }
+
+
+def share(result, payload):
+    '''Return a Response copying result, but with the given payload.'''
+    response = Response(result.status)
+    vars(response).update(vars(result), payload=payload)
+    return response
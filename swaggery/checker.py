@@ -26,7 +26,7 @@ from .keywords import *
 
 
 # A regex that can extract HTTP status codes from source code of a method.
-HTTP_STATUSES_REGEX = re.compile(r'Respond\( *(\d\d\d)')
+HTTP_STATUSES_REGEX = re.compile(r'Respon(?:d|se)\( *(\d\d\d)')
 
 
 class Checker(object):
@@ -0,0 +1,176 @@
+'''Offloading of blocking work to thread or process pools.
+
+CPU-bound (or blocking) code would stall all the requests served by the same
+worker.  It can be run in a managed `concurrent.futures` pool instead, either
+for a whole operation with `@operations(..., executor='thread'|'process')`, or
+for a single function from within an operation with:
+
+    result = yield from offload(function, *args, executor='thread')
+
+While the work is being done, the request yields cooperatively.  Operations
+run in a process pool do not have access to the request (they get None) and
+must return/raise picklable payloads (generator payloads are turned into
+lists).
+'''
+
+import inspect
+import multiprocessing
+from time import monotonic
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .flowcontrol import Respond, Response
+
+
+try:
+    CPUS = multiprocessing.cpu_count()
+except NotImplementedError:
+    CPUS = 1
+
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+DEFAULT_WORKERS = {'thread': CPUS * 5, 'process': CPUS}
+
+
+class Pool(object):
+
+    '''A lazily started executor, keeping track of its usage.
+
+    The saturation of the pool is the ratio of the pending jobs (queued or
+    running) to the number of workers: above 1, jobs are waiting in queue.
+    '''
+
+    def __init__(self, kind, max_workers=None):
+        if kind not in EXECUTORS:
+            msg = 'Executor "{}" is not available (choose among: {})'
+            raise ValueError(msg.format(kind, ', '.join(sorted(EXECUTORS))))
+        self.kind = kind
+        self.max_workers = max_workers or DEFAULT_WORKERS[kind]
+        self._executor = None
+        self.submitted = self.completed = self.failed = 0
+        self.pending = self.max_pending = 0
+        self.queue_time = self.max_queue_time = self.run_time = 0.0
+
+    @property
+    def executor(self):
+        '''The underlying executor (started at first use).'''
+        if self._executor is None:
+            self._executor = EXECUTORS[self.kind](self.max_workers)
+        return self._executor
+
+    def run(self, function, *args, **kwargs):
+        '''Run function in the pool, yielding until done (use `yield from`).'''
+        self.submitted += 1
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        future = self.executor.submit(
+            timed_call, function, monotonic(), args, kwargs)
+        try:
+            while not future.done():
+                yield
+        finally:
+            self.pending -= 1
+            future.cancel()  # No-op if running or done
+        try:
+            queue_time, run_time, result = future.result()
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        self.queue_time += queue_time
+        self.max_queue_time = max(self.max_queue_time, queue_time)
+        self.run_time += run_time
+        return result
+
+    def shutdown(self):
+        '''Shut down the executor, without waiting for pending jobs.'''
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the pool.'''
+        return {
+            'max_workers': self.max_workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'saturation': self.pending / self.max_workers,
+            'queue_time': self.queue_time,
+            'max_queue_time': self.max_queue_time,
+            'run_time': self.run_time,
+        }
+
+
+POOLS = {kind: Pool(kind) for kind in EXECUTORS}
+
+
+def configure(thread_workers=None, process_workers=None):
+    '''(Re)create the pools with the given number of workers.'''
+    for kind, workers in (('thread', thread_workers),
+                          ('process', process_workers)):
+        POOLS[kind].shutdown()
+        POOLS[kind] = Pool(kind, workers)
+
+
+def get_stats():
+    '''Return the usage statistics of the pools that have been used.'''
+    return {kind: pool.stats for kind, pool in POOLS.items() if pool.submitted}
+
+
+def offload(function, *args, executor='thread', **kwargs):
+    '''Run function in a pool, yielding until done (use `yield from`).'''
+    return (yield from POOLS[executor].run(function, *args, **kwargs))
+
+
+def run_operation(executor, cls, method, request, kwargs):
+    '''Run an operation in a pool, yielding until done (use `yield from`).'''
+    pool = POOLS[executor]
+    if executor == 'process':
+        locator = (cls.__module__, cls.__qualname__, method.__name__)
+        outcome = yield from pool.run(call_remote_operation, locator, kwargs)
+        return None if outcome is None else Response(*outcome)
+    return (yield from pool.run(call_operation, method, cls, request, kwargs))
+
+
+def timed_call(function, submitted, args, kwargs):
+    '''Call function in a worker, return (queue time, run time, result).'''
+    started = monotonic()
+    result = function(*args, **kwargs)
+    return started - submitted, monotonic() - started, result
+
+
+def call_operation(method, cls, request, kwargs):
+    '''Run an operation to completion, return its Response/Respond.'''
+    try:
+        result = method(cls, request, **kwargs)
+        if inspect.isgenerator(result):
+            while True:
+                next(result)
+    except StopIteration as e:
+        result = e.value
+    except Respond as e:
+        result = e
+    return result
+
+
+def call_remote_operation(locator, kwargs):
+    '''Run an operation to completion in a worker process.
+
+    `locator` is a (module, class qualified name, method name) tuple.  Respond
+    exceptions cannot be pickled, so the outcome is returned as a (status,
+    payload, etag, content_type) tuple.
+    '''
+    module, qualname, name = locator
+    cls = import_module(module)
+    for attribute in qualname.split('.'):
+        cls = getattr(cls, attribute)
+    result = call_operation(getattr(cls, name).method, cls, None, kwargs)
+    if result is None:
+        return None
+    payload = result.payload
+    if inspect.isgenerator(payload):
+        payload = list(payload)
+    return (result.status, payload, result.etag, result.content_type)
@@ -1,4 +1,4 @@
-'''Exception to "return" a value from the coroutines/endpoints'
+'''Exception and object to "return" a value from the coroutines/endpoints'
 
 These functions are designed to simplify the design of the various endpoints,
 transparently making them concurrent via a wrapping coroutine mechanism.
@@ -6,6 +6,15 @@ transparently making them concurrent via a wrapping coroutine mechanism.
 Also, this level of indirection masks the implementation details of the
 concurrent mechanism, that might be changed when uWSGI will natively support
 asyncio loops.
+
+Endpoints can either raise `Respond(status, payload)` or (cheaper, as no
+exception is involved) `return Response(status, payload)`.  Both optionally
+accept an `etag` (the version tag of the payload), which otherwise is computed
+from the serialized payload itself.
+
+Payloads are serialized to JSON, unless they are binary (bytes, bytearray,
+memoryview, mmap) or binary file-like objects: these are sent as they are, with
+the given `content_type` (default: "application/octet-stream").
 '''
 
 
@@ -13,8 +22,33 @@ class Respond(Exception):
 
     '''A self-rising exception for terminating the coroutine execution.'''
 
-    def __init__(self, status, payload=None):
+    def __init__(self, status, payload=None, etag=None, content_type=None):
         super().__init__(self)
         self.status = status
         self.payload = payload
+        self.etag = etag
+        self.content_type = content_type
         raise self
+
+
+class Response(object):
+
+    '''A value returned by the coroutine for terminating its execution.'''
+
+    def __init__(self, status, payload=None, etag=None, content_type=None):
+        self.status = status
+        self.payload = payload
+        self.etag = etag
+        self.content_type = content_type
+
+
+def check_etag(request, etag):
+    '''Respond with "304 Not Modified" if the client has the `etag` version.
+
+    Endpoints that can cheaply tell the version of their payload should call
+    this before computing it, and then pass the same `etag` to the response.
+    '''
+    if request.method not in ('GET', 'HEAD'):
+        return
+    if request.if_none_match.contains_weak(etag):
+        Respond(304, etag=etag)
@@ -33,6 +33,7 @@ class Introspection(Api):
     version = '1.0.0'
     path = 'introspect'
     private = True
+    priority = -1  # The first to be shed under overload
 
 
 class ResourceListing(Resource):
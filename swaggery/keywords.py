@@ -7,7 +7,7 @@ Usage:
 from .api import Api, Resource, operations
 from .utils import Ptypes
 from .logger import log
-from .flowcontrol import Respond
+from .flowcontrol import Respond, Response, check_etag
 from .models import (
     Model,
     Void,
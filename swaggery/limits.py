@@ -0,0 +1,344 @@
+'''Admission control for the operations.
+
+A bulkhead caps the number of concurrent calls to the operations it guards.
+Calls beyond the cap wait (yielding cooperatively) in a bounded FIFO queue, and
+once the queue is full they are rejected straight away with "503 Service
+Unavailable" and a `Retry-After` header.  Bulkheads are declared per operation
+with `@operations(..., max_concurrency=N, max_queue=M)` or per resource (shared
+by all its operations) with the `max_concurrency` and `max_queue` class
+attributes.
+
+A deadline caps the time an operation may take.  Deadlines are declared per
+operation with `@operations(..., deadline=SECONDS)`, and clients can shorten
+(never extend) them with the `X-Request-Deadline: SECONDS` header.  Since
+operations are cooperative, the deadline is checked every time the operation
+yields: once it is exceeded the operation generator is closed (so that its
+`finally` clauses and context managers run) and "504 Gateway Timeout" is
+returned, without affecting the other requests served by the worker.
+
+A load shedder (see `Swaggery(shedding_target=...)`) watches the sojourn time
+of the requests (from their arrival at the front server, as stamped by the
+`X-Request-Start` header, to their response) and starts rejecting requests
+with "503 Service Unavailable" once the target has been exceeded for a whole
+interval, following the CoDel control law.  Apis declare their `priority`:
+requests to Apis with a negative priority (e.g. the introspection) are shed
+first, those with a priority of `critical` or more are never shed.
+
+A body limiter caps the size of the request bodies, globally (see
+`Swaggery(max_body_size=BYTES)`) or per operation (with
+`@operations(..., max_body_size=BYTES)`, which overrides the global limit).
+Bodies are checked before the operation arguments are extracted: the declared
+`Content-Length` is checked before reading anything, while bodies of unknown
+length are read up to the limit.  Larger bodies are answered with "413 Request
+Entity Too Large".
+'''
+
+from io import BytesIO
+from math import sqrt
+from time import monotonic, time
+from collections import deque
+
+from werkzeug.exceptions import (
+    HTTPException,
+    RequestEntityTooLarge,
+    ServiceUnavailable,
+)
+from werkzeug.wsgi import get_content_length
+
+from .logger import log
+
+
+RETRY_AFTER = 1  # seconds
+DEADLINE_HEADER = 'X-Request-Deadline'
+REQUEST_START_HEADER = 'X-Request-Start'
+SHEDDING_INTERVAL = 1.0  # seconds
+# A shedder resuming within this many intervals resumes its previous rate
+SHEDDING_MEMORY = 16
+BODY_BLOCK_SIZE = 64 * 1024  # bytes
+
+
+class Overloaded(ServiceUnavailable):
+
+    '''A 503 error, advising the client when to retry.'''
+
+    def __init__(self, description=None, retry_after=RETRY_AFTER):
+        super().__init__(description)
+        self.retry_after = retry_after
+
+
+class GatewayTimeout(HTTPException):
+
+    '''A 504 error, for operations that exceeded their deadline.'''
+
+    code = 504
+    description = 'The operation did not complete within its deadline.'
+
+
+class Bulkhead(object):
+
+    '''A cap on concurrent calls, with a bounded FIFO queue of waiting ones.'''
+
+    def __init__(self, max_concurrency, max_queue=0, retry_after=RETRY_AFTER):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.active = 0
+        self.queue = deque()
+        self.admitted = self.queued = self.rejected = 0
+        self.max_active = self.max_queued = 0
+
+    def enter(self):
+        '''Wait for a free slot, yielding meanwhile (use with `yield from`).
+
+        Raise Overloaded if the queue is full.
+        '''
+        if not self.full and not self.queue:
+            self._admit()
+            return
+        if len(self.queue) >= self.max_queue:
+            self.rejected += 1
+            msg = 'Too many concurrent requests, retry later'
+            raise Overloaded(msg, self.retry_after)
+        ticket = object()
+        self.queue.append(ticket)
+        self.queued += 1
+        self.max_queued = max(self.max_queued, len(self.queue))
+        try:
+            while self.queue[0] is not ticket or self.full:
+                yield
+        except BaseException:  # The request has been aborted
+            self.queue.remove(ticket)
+            raise
+        self.queue.popleft()
+        self._admit()
+
+    @property
+    def full(self):
+        '''True if all the slots are occupied.'''
+        return self.active >= self.max_concurrency
+
+    def leave(self):
+        '''Free the slot of a call.'''
+        self.active -= 1
+
+    def _admit(self):
+        '''Occupy a slot.'''
+        self.active += 1
+        self.admitted += 1
+        self.max_active = max(self.max_active, self.active)
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the bulkhead.'''
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': len(self.queue),
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'max_active': self.max_active,
+            'max_queued': self.max_queued,
+        }
+
+
+class LoadShedder(object):
+
+    '''Reject requests while their sojourn time stays above a target.
+
+    Once the sojourn time has been above `target` for `interval` seconds, the
+    shedder enters its dropping state, in which the n-th rejection is followed
+    by a pause of interval/sqrt(n) seconds, so that the rejection rate grows
+    until the sojourn time falls below target again.  Only requests with a
+    priority below `critical` are rejected, and negative-priority ones are
+    rejected throughout the dropping state.
+    '''
+
+    def __init__(self, target, interval=SHEDDING_INTERVAL, critical=1,
+                 retry_after=RETRY_AFTER):
+        self.target = target
+        self.interval = interval
+        self.critical = critical
+        self.retry_after = retry_after
+        self.dropping = False
+        self.above_since = None
+        self.drop_next = 0.0
+        self.count = 0
+        self.admitted = self.shed = self.episodes = 0
+        self.max_sojourn = 0.0
+
+    def record(self, sojourn):
+        '''Account for a request answered `sojourn` seconds after arrival.'''
+        self.max_sojourn = max(self.max_sojourn, sojourn)
+        if sojourn < self.target:
+            self.above_since = None
+            self.dropping = False
+            return
+        now = monotonic()
+        if self.above_since is None:
+            self.above_since = now
+        elif not self.dropping and now - self.above_since >= self.interval:
+            self.dropping = True
+            self.episodes += 1
+            recent = now - self.drop_next < SHEDDING_MEMORY * self.interval
+            self.count = max(self.count - 2, 0) if recent else 0
+            self.drop_next = now
+
+    def admit(self, priority=0):
+        '''Raise Overloaded if the request is to be shed.'''
+        if self.dropping and priority < self.critical:
+            now = monotonic()
+            if priority < 0 or now >= self.drop_next:
+                if priority >= 0:
+                    self.count += 1
+                    self.drop_next = now + self.interval / sqrt(self.count)
+                self.shed += 1
+                msg = 'The service is overloaded, retry later'
+                raise Overloaded(msg, self.retry_after)
+        self.admitted += 1
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the shedder.'''
+        return {
+            'target': self.target,
+            'interval': self.interval,
+            'dropping': self.dropping,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'episodes': self.episodes,
+            'max_sojourn': self.max_sojourn,
+        }
+
+
+class BodyLimiter(object):
+
+    '''Reject request bodies larger than a maximum size.'''
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.checked = self.rejected = self.buffered = 0
+        self.largest = 0
+
+    def check(self, request, max_size=None):
+        '''Raise RequestEntityTooLarge if the body of request is too large.
+
+        `max_size` (if not None) overrides the default maximum size.  Bodies of
+        unknown length are buffered, if the server allows to read them.
+        '''
+        if max_size is None:
+            max_size = self.max_size
+            if max_size is None:
+                return
+        self.checked += 1
+        # Also enforced by werkzeug, when parsing forms
+        request.max_content_length = max_size
+        environ = request.environ
+        length = get_content_length(environ)
+        if length is None:
+            # Unless the server has terminated the input, werkzeug ignores
+            # bodies of unknown length, so there is nothing to read.
+            if not environ.get('wsgi.input_terminated'):
+                return
+            body = read_capped(environ['wsgi.input'], max_size)
+            self.buffered += 1
+            length = len(body)
+            environ['wsgi.input'] = BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(length)
+        self.largest = max(self.largest, length)
+        if length > max_size:
+            self.rejected += 1
+            msg = 'The request body exceeds the limit of {} bytes'
+            raise RequestEntityTooLarge(msg.format(max_size))
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the limiter.'''
+        return {
+            'max_size': self.max_size,
+            'checked': self.checked,
+            'rejected': self.rejected,
+            'buffered': self.buffered,
+            'largest': self.largest,
+        }
+
+
+def read_capped(stream, limit):
+    '''Read stream to its end, but no more than limit + 1 bytes.'''
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = stream.read(min(BODY_BLOCK_SIZE, limit + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks)
+
+
+def get_arrival(request):
+    '''Return the time (since the epoch) the request arrived.
+
+    Front servers can stamp requests with `X-Request-Start: [t=]TIME`, TIME
+    being in seconds, milliseconds or microseconds since the epoch.  Without
+    a (valid) stamp, the request is deemed to have just arrived.
+    '''
+    now = time()
+    value = request.headers.get(REQUEST_START_HEADER)
+    if not isinstance(value, str):
+        return now
+    try:
+        arrival = float(value.strip().lstrip('t='))
+    except ValueError:
+        return now
+    for scale in (1, 1e3, 1e6):
+        if 0 < arrival / scale < now * 100:
+            return min(arrival / scale, now)
+    return now
+
+
+def get_timeout(request, deadline=None):
+    '''Return the time budget of a request (None for no limit).
+
+    The deadline of the operation can only be shortened by the request header,
+    and malformed header values are ignored.
+    '''
+    try:
+        requested = request.headers.get(DEADLINE_HEADER)
+        requested = float(requested) if isinstance(requested, str) else None
+    except (AttributeError, ValueError):
+        requested = None
+    if requested is None or not requested >= 0:  # Missing, NaN or negative
+        return deadline
+    return requested if deadline is None else min(deadline, requested)
+
+
+def enforce_deadline(coroutine, timeout):
+    '''Drive `coroutine` (use with `yield from`) for at most `timeout` secs.
+
+    Values yielded by the coroutine are passed through and exceptions thrown
+    in are forwarded to it.  Raise GatewayTimeout once the time is up.
+    '''
+    expiry = monotonic() + timeout
+    exception = None
+    while True:
+        try:
+            if exception is None:
+                value = coroutine.send(None)
+            else:
+                value, exception = coroutine.throw(exception), None
+        except StopIteration as e:
+            return e.value
+        if monotonic() >= expiry:
+            coroutine.close()
+            log.warning('Operation cancelled after its {}s deadline'.format(
+                timeout))
+            raise GatewayTimeout()
+        try:
+            yield value
+        except GeneratorExit:
+            coroutine.close()
+            raise
+        except Exception as e:
+            exception = e
@@ -6,11 +6,70 @@ hold an individual description of the returned data.
 
 All the business logic is however delegated entirely to the class (precisely
 as for Api and Resource classes).
+
+Native models also know how to parse the raw (string) values of parameters:
+`coerce` converts a string to the model type (raising ValueError if it cannot)
+and `converter` is the name of the werkzeug converter for path parameters (see
+`routing.CONVERTERS`).
+
+Custom models can validate documents against their schema: the validator is
+compiled on first use (the application does it at mount time) and then reused.
 '''
 
+import re
+from datetime import datetime, timedelta, timezone
+
+from jsonschema import Draft4Validator
+from jsonschema.validators import validator_for
+
 from .utils import RegisterLeafModels, classproperty
 
 
+BOOLEANS = {
+    'true': True, 'yes': True, 'on': True, '1': True,
+    'false': False, 'no': False, 'off': False, '0': False,
+}
+DATETIME_RE = re.compile(
+    r'(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2})(?:\.(\d+))?'
+    r'(Z|[+-]\d{2}:?\d{2})?$', re.IGNORECASE)
+
+
+def parse_boolean(value):
+    '''Parse a boolean, like "true", "yes", "on", "1" or their opposites.'''
+    try:
+        return BOOLEANS[value.lower()]
+    except KeyError:
+        raise ValueError('Invalid boolean: "{}"'.format(value))
+
+
+def parse_date(value):
+    '''Parse an ISO 8601 date, like "2014-05-01".'''
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_datetime(value):
+    '''Parse an ISO 8601 date-time, like "2014-05-01T12:30:00.5+02:00".
+
+    Date-times without an offset are returned as naive datetime objects.
+    '''
+    match = DATETIME_RE.match(value)
+    if match is None:
+        raise ValueError('Invalid date-time: "{}"'.format(value))
+    stamp, fraction, offset = match.groups()
+    result = datetime.strptime(stamp.replace(' ', 'T'), '%Y-%m-%dT%H:%M:%S')
+    if fraction:
+        result = result.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+    if offset:
+        offset = offset.upper().replace(':', '')
+        minutes = 0
+        if offset != 'Z':
+            minutes = int(offset[1:3]) * 60 + int(offset[3:])
+            if offset[0] == '-':
+                minutes = -minutes
+        result = result.replace(tzinfo=timezone(timedelta(minutes=minutes)))
+    return result
+
+
 class Model(object, metaclass=RegisterLeafModels):
 
     '''Models describe the data structure which go through the interface.
@@ -27,6 +86,8 @@ class Model(object, metaclass=RegisterLeafModels):
 
     schema = None
     native_type = False
+    converter = None
+    coerce = None
 
     def __init__(self, description, **kwargs):
         self._description = description
@@ -41,6 +102,16 @@ class Model(object, metaclass=RegisterLeafModels):
         '''Return the name of the model as to be used in swagger.'''
         return cls.native_type or cls.__name__
 
+    @classproperty
+    def validator(cls):
+        '''Return the compiled validator of the schema (None if no schema).'''
+        validator = vars(cls).get('_validator')
+        if validator is None and cls.schema is not None:
+            factory = validator_for(cls.schema, default=Draft4Validator)
+            factory.check_schema(cls.schema)
+            validator = cls._validator = factory(cls.schema)
+        return validator
+
     @classproperty
     def model(cls):
         '''Return the Model to be insertend in the swagger declaration.'''
@@ -75,6 +146,8 @@ class Integer(Model):
     '''Integer numbers.'''
 
     native_type = 'integer'
+    converter = 'integer'
+    coerce = staticmethod(int)
     _allowed_extra_params = ('defaultValue', 'format')
 
 
@@ -83,6 +156,8 @@ class Float(Model):
     '''Floating point numbers.'''
 
     native_type = 'float'
+    converter = 'number'
+    coerce = staticmethod(float)
     _allowed_extra_params = ('defaultValue', 'format', 'minimum', 'maximum')
 
 
@@ -99,6 +174,8 @@ class Boolean(Model):
     '''Boolean.'''
 
     native_type = 'boolean'
+    converter = 'boolean'
+    coerce = staticmethod(parse_boolean)
     _allowed_extra_params = ('defaultValue', 'format')
 
 
@@ -107,6 +184,8 @@ class Date(Model):
     '''Dates.'''
 
     native_type = 'date'
+    converter = 'date'
+    coerce = staticmethod(parse_date)
     _allowed_extra_params = ('defaultValue', 'format')
 
 
@@ -115,6 +194,8 @@ class DateTime(Model):
     '''DateTimes.'''
 
     native_type = 'date-time'
+    converter = 'datetime'
+    coerce = staticmethod(parse_datetime)
     _allowed_extra_params = ('defaultValue', 'format')
 
 
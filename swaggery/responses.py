@@ -1,11 +1,18 @@
 '''Custom responses for specific error codes.'''
 
+import os
+import copy
+import mmap
+import zlib
 import uuid
 import inspect
-from werkzeug.wrappers import Response
+from time import monotonic
+from functools import lru_cache, partial
+
+from werkzeug.http import HTTP_STATUS_CODES, generate_etag, quote_etag
 
 from .logger import log
-from .utils import jsonify
+from .utils import JSON_ENCODERS, DEFAULT_JSON_PROFILE
 
 
 HEADERS = [
@@ -15,51 +22,246 @@ HEADERS = [
     ('Content-Type', 'application/json; charset=utf-8'),
 ]
 
+# Clients can ask for streamed payloads to be sent as JSON lines
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NDJSON_HEADERS = [
+    ('Content-Type', '{}; charset=utf-8'.format(NDJSON_MIMETYPE))
+    if name == 'Content-Type' else (name, value) for name, value in HEADERS
+] + [('Vary', 'Accept')]
+ARRAY_HEADERS = HEADERS + [('Vary', 'Accept')]
+
+# Binary payloads (and binary file-like objects) are not serialized to JSON
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+RAW_MIMETYPE = 'application/octet-stream'
+# Binary payloads are written in blocks of this many bytes
+RAW_BLOCK_SIZE = 64 * 1024
+
+# Supported content-codings (in order of preference) and their zlib `wbits`
+COMPRESSIONS = (('gzip', 16 + zlib.MAX_WBITS), ('deflate', zlib.MAX_WBITS))
+COMPRESSION_LEVEL = 6
+# Monolithic bodies smaller than this many bytes are never compressed
+COMPRESSION_THRESHOLD = 1024
+
+# Status lines, as expected by `start_response`
+STATUS_LINES = {code: '{} {}'.format(code, reason.upper())
+                for code, reason in HTTP_STATUS_CODES.items()}
+
+# Streamed payloads are written in chunks of (at least) this many bytes...
+STREAM_CHUNK_SIZE = 16 * 1024
+# ...unless this many seconds have passed since the last chunk was written.
+STREAM_FLUSH_INTERVAL = 0.5
+
 
-class AsyncResponse(Response):
+class AsyncResponse(object):
 
-    '''Enhance the usual response to support async behaviour.'''
+    '''A lean response, supporting async behaviour.
 
-    def __init__(self, payload, *args, **kwargs):
+    Unlike werkzeug's `Response`, no `Headers` object is built: `headers` is
+    the plain list of header tuples handed over to `start_response`, made by
+    extending one of the pre-built lists defined in this module.
+    '''
+
+    def __init__(self, payload, status=200, headers=HEADERS,
+                 json_profile=DEFAULT_JSON_PROFILE,
+                 chunk_size=STREAM_CHUNK_SIZE,
+                 flush_interval=STREAM_FLUSH_INTERVAL, stream_format='array',
+                 encoding=None, compression_threshold=COMPRESSION_THRESHOLD,
+                 etag=None, if_none_match=None):
         self.payload = payload
+        self.dumps = JSON_ENCODERS[json_profile]
+        self.stream_format = stream_format
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        raw = is_raw_payload(payload)
+        if raw:  # Binary payloads are sent as they are
+            compression_threshold = None
+        if compression_threshold is None:
+            encoding = None
+        # The same tag identifies the plain and the compressed representations
+        # of the payload, so it can only be a weak one if they are both served
+        weak_etag = encoding is not None
+        extra_headers = []
         if inspect.isgenerator(payload):
-            super().__init__(payload, *args, direct_passthrough=True, **kwargs)
+            self.data = None
+        elif raw:
+            self.data = None
+            size = get_raw_size(payload)
+            if size is not None:
+                extra_headers.append(('Content-Length', str(size)))
         else:
-            super().__init__(jsonify(payload), *args, **kwargs)
+            data = self.dumps(payload).encode()
+            if etag is True:
+                etag = generate_etag(data)
+            if if_none_match is not None and if_none_match.contains_weak(etag):
+                status = 304
+            if status == 304:
+                data = b''
+            if encoding is not None and len(data) >= compression_threshold:
+                data = self.compress(data, encoding)
+            else:
+                encoding = None
+            if status != 304:
+                extra_headers.append(('Content-Length', str(len(data))))
+            self.data = data
+        self.status_code = status
+        self.encoding = encoding
+        self.etag = etag
+        if etag is not None:
+            # Werkzeug would spell the (case-sensitive) weak prefix as "w/"
+            prefix = 'W/' if weak_etag else ''
+            extra_headers.append(('ETag', prefix + quote_etag(etag)))
+        if compression_threshold is not None:
+            extra_headers.append(('Vary', 'Accept-Encoding'))
+        if encoding is not None:
+            extra_headers.append(('Content-Encoding', encoding))
+        self.headers = headers + extra_headers
+
+    @property
+    def status(self):
+        '''The status line of the response.'''
+        try:
+            return STATUS_LINES[self.status_code]
+        except KeyError:
+            return '{} UNKNOWN'.format(self.status_code)
+
+    def not_modified(self):
+        '''Return an empty "304 Not Modified" copy of the response.'''
+        response = copy.copy(self)
+        response.status_code = 304
+        response.data = b''
+        response.headers = [
+            (name, value) for name, value in self.headers
+            if name not in ('Content-Length', 'Content-Encoding')]
+        return response
+
+    @staticmethod
+    def compress(data, encoding):
+        '''Return data compressed according to the content-coding.'''
+        compressor = make_compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks):
+        '''Compress a stream of chunks incrementally.
+
+        The compressor is flushed after each chunk (since chunks are coalesced
+        this happens periodically) so that clients can decode the stream as it
+        arrives.
+        '''
+        compressor = make_compressor(self.encoding)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            yield compressed + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
 
     def stream_array(self, generator):
         '''Helper function to stream content as an array of JSON values.'''
+        dumps = self.dumps
+
         def chunkify(generator):
             log.debug('Data Stream STARTED')
-            yield '['.encode()
             # In order to have commas only after the first value, we take the
             # first value of the generator manually
             try:
-                yield jsonify(next(generator)).encode()
+                yield '[{}'.format(dumps(next(generator))).encode()
             except StopIteration:
-                pass
-            while True:
-                try:
-                    bit = next(generator)
-                except StopIteration:
-                    yield ']'.encode()
-                    break
-                else:
-                    yield ',\n'.encode()
-                    yield jsonify(bit).encode()
+                yield '[]'.encode()
+            else:
+                for bit in generator:
+                    yield ',\n{}'.format(dumps(bit)).encode()
+                yield ']'.encode()
+            log.debug('Data Stream ENDED')
+        return self.coalesce(chunkify(generator))
+
+    def stream_lines(self, generator):
+        '''Helper function to stream content as JSON values, one per line.'''
+        dumps = self.dumps
+
+        def chunkify(generator):
+            log.debug('Data Stream STARTED')
+            for bit in generator:
+                yield '{}\n'.format(dumps(bit)).encode()
             log.debug('Data Stream ENDED')
-        return chunkify(generator)
+        return self.coalesce(chunkify(generator))
+
+    def stream_raw(self, environ):
+        '''Helper function to write binary payloads and files.
+
+        Buffers are written in blocks, without copying them as a whole.  Files
+        are handed over to the server `wsgi.file_wrapper`, if any: uWSGI sends
+        the file with sendfile() when the wrapper itself is yielded.
+        '''
+        payload = self.payload
+        if isinstance(payload, bytes):
+            yield payload
+        elif isinstance(payload, BUFFER_TYPES):
+            view = memoryview(payload).cast('B')
+            for start in range(0, len(view), RAW_BLOCK_SIZE):
+                yield view[start:start + RAW_BLOCK_SIZE].tobytes()
+        elif 'wsgi.file_wrapper' in environ:
+            wrapper = environ['wsgi.file_wrapper'](payload, RAW_BLOCK_SIZE)
+            if 'uwsgi.version' in environ:
+                yield wrapper
+                return
+            try:
+                yield from wrapper
+            finally:
+                if hasattr(wrapper, 'close'):
+                    wrapper.close()
+        else:
+            try:
+                yield from iter(partial(payload.read, RAW_BLOCK_SIZE), b'')
+            finally:
+                payload.close()
+
+    def coalesce(self, chunks):
+        '''Group streamed chunks into bigger ones, to reduce writes.
+
+        The first chunk is passed through straight away (so as not to delay the
+        time to first byte), the following ones are buffered until either
+        `chunk_size` bytes are collected or `flush_interval` seconds (if not
+        None) have passed since the last write.
+        '''
+        chunks = iter(chunks)
+        for chunk in chunks:
+            yield chunk
+            break
+        chunk_size = self.chunk_size
+        flush_interval = self.flush_interval
+        buffer = []
+        size = 0
+        last_flush = monotonic()
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size < chunk_size:
+                if flush_interval is None:
+                    continue
+                now = monotonic()
+                if now - last_flush < flush_interval:
+                    continue
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+            last_flush = monotonic()
+        if buffer:
+            yield b''.join(buffer)
 
     def async(self, environ, start_response):
-        start_response(self.status, list(self.headers))
+        start_response(self.status, self.headers)
         if inspect.isgenerator(self.payload):
             log.debug('Starting stream response')
-            yield from self.stream_array(self.payload)
+            if self.stream_format == 'ndjson':
+                chunks = self.stream_lines(self.payload)
+            else:
+                chunks = self.stream_array(self.payload)
+            if self.encoding is not None:
+                chunks = self.compress_stream(chunks)
+            yield from chunks
+        elif self.data is None:
+            log.debug('Starting raw response')
+            yield from self.stream_raw(environ or {})
         else:
             log.debug('Starting monolithic response')
-            # The use of self.data over self.payload is due to the need of
-            # having an header with the correct lenght information.  A JSON
-            # string, for example, has 2 characters '"' wrapping it...
             yield self.data
 
 
@@ -67,7 +269,7 @@ class BadResponse(AsyncResponse):
 
     '''Logs an exception and return an ad-hoc response.'''
 
-    def __init__(self, request, exception):
+    def __init__(self, request, exception, **kwargs):
         code = getattr(exception, 'code', 500)  # Default for code breakage
         if code == 500:
             payload = self.process_500(request, exception)
@@ -75,7 +277,13 @@ class BadResponse(AsyncResponse):
             msg = exception.description
             log.info('HTTP:{} --- {}'.format(code, msg))
             payload = {'code': code, 'message': msg}
-        super().__init__(payload, status=code, headers=HEADERS)
+        headers = HEADERS
+        # Overloaded services advise clients when to retry
+        retry_after = getattr(exception, 'retry_after', None)
+        if retry_after is not None:
+            headers = HEADERS + [('Retry-After', str(retry_after))]
+        kwargs.setdefault('encoding', negotiate_encoding(request))
+        super().__init__(payload, status=code, headers=headers, **kwargs)
 
     def process_500(self, request, exception):
         '''Internal server error.'''
@@ -92,8 +300,97 @@ class GoodResponse(AsyncResponse):
 
     '''Linghtweight wrapper that inject headers and jsonify the output.'''
 
-    def __init__(self, request, respond_exception):
+    def __init__(self, request, respond_exception, **kwargs):
         payload = respond_exception.payload
         status = respond_exception.status
+        headers = HEADERS
+        raw = is_raw_payload(payload)
+        if raw:
+            content_type = getattr(respond_exception, 'content_type', None)
+            headers = make_headers(content_type or RAW_MIMETYPE)
+            # Hashing (maybe huge) payloads to tag them would defeat the
+            # purpose, so only tags supplied by the endpoint are used
+            kwargs['etag'] = getattr(respond_exception, 'etag', None)
+        elif inspect.isgenerator(payload):
+            headers = ARRAY_HEADERS
+            if negotiate_stream_format(request) == 'ndjson':
+                headers = NDJSON_HEADERS
+                kwargs['stream_format'] = 'ndjson'
+                # Pretty-printed values would span several lines
+                if kwargs.get('json_profile') == 'pretty':
+                    kwargs['json_profile'] = 'compact'
+        # Monolithic responses to GET requests are tagged with their version,
+        # so that they can be cached (and then validated) by clients.
+        elif request is not None and request.method in ('GET', 'HEAD'):
+            etag = getattr(respond_exception, 'etag', None)
+            if status == 200:
+                kwargs['etag'] = etag or True
+                kwargs['if_none_match'] = request.if_none_match
+            elif status == 304:
+                kwargs['etag'] = etag
+        # Resources can opt out of compression
+        if getattr(respond_exception, 'compress', True):
+            kwargs.setdefault('encoding', negotiate_encoding(request))
+        else:
+            kwargs['compression_threshold'] = None
         # TODO: What happens to e.description? See: http://goo.gl/YZ664K
-        super().__init__(payload, status=status, headers=HEADERS)
+        super().__init__(payload, status=status, headers=headers, **kwargs)
+
+
+@lru_cache(maxsize=64)
+def make_headers(content_type):
+    '''Return the response headers for a given content type.'''
+    return [(name, content_type) if name == 'Content-Type' else (name, value)
+            for name, value in HEADERS]
+
+
+def is_raw_payload(payload):
+    '''Return True if payload is binary data or a file, rather than JSON.'''
+    return isinstance(payload, BUFFER_TYPES) or hasattr(payload, 'read')
+
+
+def get_raw_size(payload):
+    '''Return the size in bytes of a raw payload (None if unknown).'''
+    if isinstance(payload, BUFFER_TYPES):
+        return memoryview(payload).nbytes
+    try:
+        return os.fstat(payload.fileno()).st_size - payload.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def make_compressor(encoding):
+    '''Return a zlib compressor for the given content-coding.'''
+    wbits = dict(COMPRESSIONS)[encoding]
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, wbits)
+
+
+def negotiate_encoding(request):
+    '''Return the content-coding to compress the response with (or None).'''
+    if request is None:
+        return None
+    encodings = [name for name, _ in COMPRESSIONS]
+    return negotiate(request.accept_encodings, encodings)
+
+
+def negotiate_stream_format(request):
+    '''Return the format ("array" or "ndjson") to stream payloads with.'''
+    if request is None:
+        return 'array'
+    best = negotiate(request.accept_mimetypes,
+                     ['application/json', NDJSON_MIMETYPE])
+    return 'ndjson' if best == NDJSON_MIMETYPE else 'array'
+
+
+def negotiate(accept, offers):
+    '''Return the offer the client prefers (None if it accepts none).
+
+    Unlike `Accept.best_match`, offers given "q=0" (explicitly, or through a
+    wildcard) are not acceptable (RFC 7231, section 5.3.1).
+    '''
+    refused = {value.lower() for value, quality in accept if quality <= 0}
+    offers = [offer for offer in offers if offer.lower() not in refused]
+    best = accept.best_match(offers)
+    if best not in offers or accept.quality(best) <= 0:
+        return None
+    return best
@@ -0,0 +1,274 @@
+'''Routing of requests onto the endpoints of the mounted resources.
+
+A router is built from the werkzeug rules of all resources and exposes a
+single `match(request)` method returning the same (endpoint, kwargs) tuple a
+werkzeug MapAdapter would, raising werkzeug's HTTPExceptions on failure.
+
+Two engines are available (see ROUTERS): "werkzeug", which is werkzeug's own
+linear scan of the rules (plus a fast path for static ones), and "radix",
+which compiles the rules into a segment tree whose match cost depends on the
+depth of the path rather than on the number of rules.
+
+Both engines know the converters of the native models (see CONVERTERS), so
+that path parameters are parsed to their declared type while routing.
+'''
+
+import re
+
+from werkzeug.exceptions import BadRequest, NotFound, MethodNotAllowed
+from werkzeug.routing import (
+    Map,
+    BaseConverter,
+    RequestRedirect,
+    ValidationError,
+    parse_rule,
+    parse_converter_args,
+)
+
+from .models import Integer, Float, Boolean, Date, DateTime
+
+
+class ModelConverter(BaseConverter):
+
+    '''A converter parsing path segments with the `coerce` of a Model.
+
+    The variable takes the whole segment, and values that cannot be parsed
+    are answered with "400 Bad Request" (rather than not matching the rule).
+    '''
+
+    model = None
+
+    def to_python(self, value):
+        try:
+            return self.model.coerce(value)
+        except ValueError as e:
+            msg = 'Invalid value for path parameter: {}'
+            raise BadRequest(msg.format(e))
+
+
+CONVERTERS = {
+    model.converter: type('{}Converter'.format(model.__name__),
+                          (ModelConverter, ), {'model': model})
+    for model in (Integer, Float, Boolean, Date, DateTime)
+}
+
+
+class WerkzeugRouter(object):
+
+    '''Route requests with werkzeug, short-circuiting static rules.
+
+    Rules without any `<converter>` are also indexed in a dictionary keyed on
+    (method, path), so that static paths are resolved with a single lookup.
+    Everything else (parametric rules, but also 404 and 405 decisions) is
+    delegated to the werkzeug Map.
+    '''
+
+    def __init__(self, rules):
+        self.url_map = Map(rules, converters=CONVERTERS)
+        self.static_routes = {}
+        for rule in self.url_map.iter_rules():
+            if rule.arguments or rule.methods is None:
+                continue
+            for method in rule.methods:
+                key = (method, rule.rule)
+                self.static_routes.setdefault(key, rule.endpoint)
+
+    def match(self, request):
+        '''Return the (endpoint, kwargs) tuple matching the request.'''
+        try:
+            endpoint = self.static_routes[request.method, request.path]
+        except KeyError:
+            adapter = self.url_map.bind_to_environ(request.environ)
+            return adapter.match()
+        return endpoint, {}
+
+
+class RadixRouter(object):
+
+    '''Route requests by walking a tree of path segments.
+
+    Each node of the tree maps static segments to child nodes, and also holds
+    an ordered list of dynamic segments (containing one or more werkzeug
+    `<converter>`s) that are tried after the static ones.  Leaf nodes map HTTP
+    methods to endpoints.  This reproduces werkzeug's preference of static
+    over dynamic matches, as well as its 404, 405 and trailing-slash redirect
+    decisions.  Converters matching slashes (e.g.: `path`) are not supported.
+    '''
+
+    def __init__(self, rules):
+        # Only used as a factory for converters
+        self.url_map = Map(converters=CONVERTERS)
+        self.root = _Node()
+        # Not used for routing, but exposed as in WerkzeugRouter
+        self.static_routes = {}
+        for rule in rules:
+            self._add_rule(rule)
+        self.root.sort()
+
+    def _add_rule(self, rule):
+        '''Graft a werkzeug rule onto the tree.'''
+        node = self.root
+        for tokens in _split_rule(rule.rule):
+            if all(converter is None for converter, _, _ in tokens):
+                static = ''.join(variable for _, _, variable in tokens)
+                node = node.static.setdefault(static, _Node())
+            else:
+                node = node.get_dynamic_child(
+                    tuple(tokens), self.url_map, rule.rule)
+        methods = rule.methods if rule.methods is not None else (None, )
+        for method in methods:
+            node.endpoints.setdefault(method, (rule.endpoint, rule.defaults))
+        if '<' not in rule.rule and not rule.defaults and None not in methods:
+            for method in methods:
+                key = (method, rule.rule)
+                self.static_routes.setdefault(key, rule.endpoint)
+
+    def _walk(self, node, segments, index, kwargs, error=None):
+        '''Generate the (leaf node, kwargs, error) matching segments.
+
+        Matches are generated by priority.  `error` is the first BadRequest
+        raised by a converter on the way (None if none was): as werkzeug does,
+        it is raised only if the whole rule matches.
+        '''
+        if index == len(segments):
+            if node.endpoints:
+                yield node, kwargs, error
+            return
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            yield from self._walk(child, segments, index + 1, kwargs, error)
+        for dynamic, child in node.dynamic:
+            child_error = error
+            try:
+                values = dynamic.match(segment)
+            except BadRequest as e:
+                values, child_error = {}, error or e
+            if values is not None:
+                values.update(kwargs)
+                yield from self._walk(
+                    child, segments, index + 1, values, child_error)
+
+    def match(self, request):
+        '''Return the (endpoint, kwargs) tuple matching the request.'''
+        method = request.method
+        path = request.path
+        have_match_for = set()
+        segments = path[1:].split('/')
+        for node, kwargs, error in self._walk(self.root, segments, 0, {}):
+            if error is not None:  # As werkzeug, whatever the method
+                raise error
+            try:
+                endpoint, defaults = node.endpoints[method]
+            except KeyError:
+                try:
+                    endpoint, defaults = node.endpoints[None]
+                except KeyError:
+                    have_match_for.update(node.endpoints)
+                    continue
+            if defaults:
+                kwargs.update(defaults)
+            return endpoint, kwargs
+        # As werkzeug, the missing trailing slash takes precedence over 405
+        if not path.endswith('/'):
+            segments = (path + '/')[1:].split('/')
+            for _ in self._walk(self.root, segments, 0, {}):
+                new_url = request.base_url + '/'
+                if request.query_string:
+                    new_url += '?' + request.query_string.decode('latin-1')
+                raise RequestRedirect(new_url)
+        if have_match_for:
+            raise MethodNotAllowed(valid_methods=list(have_match_for))
+        raise NotFound()
+
+
+class _Node(object):
+
+    '''A node of the RadixRouter tree.'''
+
+    __slots__ = ('static', 'dynamic', 'endpoints')
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = []
+        self.endpoints = {}
+
+    def get_dynamic_child(self, tokens, url_map, rule):
+        '''Return the child node for a dynamic segment, creating it if new.'''
+        for dynamic, child in self.dynamic:
+            if dynamic.tokens == tokens:
+                return child
+        child = _Node()
+        self.dynamic.append((_DynamicSegment(tokens, url_map, rule), child))
+        return child
+
+    def sort(self):
+        '''Recursively sort dynamic segments by the weight of converters.'''
+        self.dynamic.sort(key=lambda item: item[0].weights)
+        for child in self.static.values():
+            child.sort()
+        for _, child in self.dynamic:
+            child.sort()
+
+
+class _DynamicSegment(object):
+
+    '''A path segment containing one or more werkzeug converters.'''
+
+    def __init__(self, tokens, url_map, rule):
+        self.tokens = tokens
+        self.converters = {}
+        weights = []
+        regex = []
+        for converter, arguments, variable in tokens:
+            if converter is None:
+                regex.append(re.escape(variable))
+                continue
+            if arguments:
+                args, kwargs = parse_converter_args(arguments)
+            else:
+                args, kwargs = (), {}
+            convobj = url_map.converters[converter](url_map, *args, **kwargs)
+            if re.match('(?:{})$'.format(convobj.regex), 'x/y'):
+                msg = 'Converter "{}" in rule "{}" spans several segments'
+                raise ValueError(msg.format(converter, rule))
+            regex.append('(?P<{}>{})'.format(variable, convobj.regex))
+            self.converters[variable] = convobj
+            weights.append(convobj.weight)
+        self.weights = tuple(weights)
+        self.regex = re.compile('^{}$'.format(''.join(regex)), re.UNICODE)
+
+    def match(self, segment):
+        '''Return the converted values in segment, or None if no match.'''
+        found = self.regex.match(segment)
+        if found is None:
+            return None
+        values = {}
+        for name, value in found.groupdict().items():
+            try:
+                values[name] = self.converters[name].to_python(value)
+            except ValidationError:
+                return None
+        return values
+
+
+def _split_rule(rule):
+    '''Split a werkzeug rule into segments (lists of parse_rule tokens).'''
+    segments = [[]]
+    for converter, arguments, variable in parse_rule(rule):
+        if converter is not None:
+            segments[-1].append((converter, arguments, variable))
+            continue
+        parts = variable.split('/')
+        for n, part in enumerate(parts):
+            if n:
+                segments.append([])
+            if part:
+                segments[-1].append((None, None, part))
+    return segments[1:]  # Rules start with a slash
+
+
+ROUTERS = {
+    'werkzeug': WerkzeugRouter,
+    'radix': RadixRouter,
+}
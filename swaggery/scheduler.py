@@ -0,0 +1,100 @@
+'''Cooperative scheduling of the operation coroutines.
+
+Operations relinquish control by doing a bare `yield`, after which the server
+(uWSGI async cores, or the asyncio loop) resumes the other requests in a round-
+robin fashion.  With cooperative multitasking there is no way to pre-empt a
+step that runs for too long, but its request can be made to wait for extra
+turns afterwards, so that its neighbours catch up.  The available policies
+are:
+    - round-robin: each step is followed by exactly one turn (the server
+      default), but steps are timed and overruns of the budget counted.
+    - weighted: a step lasting N times the budget of its request (the
+      scheduler budget times the weight of the operation) is followed by N
+      extra turns, so that the CPU time is shared proportionally to weights.
+'''
+
+from time import perf_counter
+
+
+POLICIES = ('round-robin', 'weighted')
+DEFAULT_BUDGET = 0.01  # seconds
+# A request is never deferred by more than this many turns after a step
+MAX_PENALTY = 16
+
+
+class Scheduler(object):
+
+    '''Drive operation coroutines, sharing the CPU among requests.'''
+
+    def __init__(self, policy='round-robin', budget=DEFAULT_BUDGET):
+        if policy not in POLICIES:
+            msg = 'Scheduling policy "{}" is not available (choose among: {})'
+            raise ValueError(msg.format(policy, ', '.join(POLICIES)))
+        self.policy = policy
+        self.budget = budget
+        self.requests = self.steps = self.overruns = self.deferrals = 0
+        self.time = self.max_step = 0.0
+
+    def run(self, coroutine, weight=1):
+        '''Drive `coroutine` (to be used with `yield from`), return its value.
+
+        Values yielded by the coroutine (e.g. asyncio futures) are passed
+        through, and exceptions thrown in are forwarded to the coroutine.
+        '''
+        self.requests += 1
+        quantum = self.budget * weight
+        weighted = self.policy == 'weighted'
+        exception = None
+        while True:
+            start = perf_counter()
+            try:
+                if exception is None:
+                    value = coroutine.send(None)
+                else:
+                    value = coroutine.throw(exception)
+                    exception = None
+            except StopIteration as e:
+                self._account(perf_counter() - start)
+                return e.value
+            except Exception:
+                self._account(perf_counter() - start)
+                raise
+            elapsed = perf_counter() - start
+            self._account(elapsed)
+            turns = 1
+            if elapsed > quantum:
+                self.overruns += 1
+                if weighted:
+                    penalty = min(int(elapsed / quantum), MAX_PENALTY)
+                    self.deferrals += penalty
+                    turns += penalty
+            try:
+                for _ in range(turns):
+                    yield value
+                    value = None
+            except GeneratorExit:
+                coroutine.close()
+                raise
+            except Exception as e:
+                exception = e
+
+    def _account(self, elapsed):
+        '''Update the metrics with a step that lasted `elapsed` seconds.'''
+        self.steps += 1
+        self.time += elapsed
+        if elapsed > self.max_step:
+            self.max_step = elapsed
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the scheduler.'''
+        return {
+            'policy': self.policy,
+            'budget': self.budget,
+            'requests': self.requests,
+            'steps': self.steps,
+            'time': self.time,
+            'max_step': self.max_step,
+            'overruns': self.overruns,
+            'deferrals': self.deferrals,
+        }
@@ -0,0 +1,173 @@
+'''Incremental parsing of large JSON request bodies.
+
+Body parameters are normally read whole, decoded and parsed before the
+operation is called, which needs several copies of the body in memory.
+Operations declared with `@operations(..., stream_body=True)` receive instead
+an iterator over the items of the body, parsed one at a time while reading the
+request stream: either the elements of a top-level JSON array or (with
+`Content-Type: application/x-ndjson`) the newline-delimited JSON documents.
+Only the item being parsed (and a block of input) is held in memory, and the
+operation can process the first items before the upload is complete:
+
+    @operations('POST', stream_body=True)
+    def ingest(cls, request, points: (Ptypes.body, Points('Points'))) -> [
+            (200, 'Ok', Integer)]:
+        count = 0
+        for point in points:
+            count += 1
+            yield  # Cooperate with the other requests
+        Respond(200, count)
+
+Malformed bodies raise BadRequest while iterating, after the items preceding
+the error have been handed to the operation.  If requests are validated, each
+item is validated against the `items` schema of the body Model.  Since an item
+that never ends is read up to the end of the body, streamed bodies should still
+be capped with `max_body_size` (see the `limits` module).
+
+The bounded memory guarantee holds only for WSGI servers: the ASGI application
+(see the `asgi` module) reads the whole body before dispatching the request, so
+that its items are parsed from memory.
+'''
+
+import re
+import json
+import codecs
+
+from werkzeug.exceptions import BadRequest
+from jsonschema.exceptions import best_match
+
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+STREAM_BLOCK_SIZE = 64 * 1024  # bytes
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_CONTINUATIONS = frozenset('0123456789.eE+-')
+
+
+class TextBuffer(object):
+
+    '''Text decoded incrementally from a UTF-8 encoded binary stream.
+
+    `text[position:]` is the text read but not consumed yet.  Consumed text is
+    discarded at the next read, so memory is bounded by the size of the values
+    being parsed (plus a block of input).
+    '''
+
+    def __init__(self, stream, block_size=STREAM_BLOCK_SIZE):
+        self.stream = stream
+        self.block_size = block_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.position = 0
+        self.eof = False
+
+    def read(self, size=0):
+        '''Read at least a block more, return False if at end of stream.'''
+        if self.eof:
+            return False
+        chunk = self.stream.read(max(self.block_size, size))
+        self.eof = not chunk
+        text = self.decoder.decode(chunk, final=self.eof)
+        self.text = self.text[self.position:] + text
+        self.position = 0
+        return True
+
+    def peek(self):
+        '''Skip whitespace, return the next character ('' at end of stream).'''
+        while True:
+            self.position = WHITESPACE.match(self.text, self.position).end()
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.read():
+                return ''
+
+    def expect(self, characters):
+        '''Consume and return the next character, if it is among characters.
+
+        Raise ValueError otherwise.
+        '''
+        character = self.peek()
+        if not character or character not in characters:
+            msg = 'Expecting one of "{}" at character {}'
+            raise ValueError(msg.format(characters, self.position))
+        self.position += 1
+        return character
+
+    def decode(self, raw_decode):
+        '''Consume and return the next JSON value.'''
+        self.peek()
+        while True:
+            try:
+                value, end = raw_decode(self.text, self.position)
+            except ValueError:
+                # Possibly a value truncated at the end of the buffer: the read
+                # size doubles, so that long values are parsed in linear time
+                if self.read(len(self.text)):
+                    continue
+                raise
+            # Values ending with the buffer, or numbers parsed up to their
+            # fraction or exponent (e.g.: "-2." or "1e"), may go on
+            truncated = (end == len(self.text) or
+                         self.text[end] in NUMBER_CONTINUATIONS)
+            if not truncated or not self.read(len(self.text)):
+                self.position = end
+                return value
+
+
+def iter_array(stream, block_size=STREAM_BLOCK_SIZE):
+    '''Generate the elements of the JSON array read from stream.'''
+    buffer = TextBuffer(stream, block_size)
+    raw_decode = json.JSONDecoder().raw_decode
+    buffer.expect('[')
+    if buffer.peek() == ']':
+        buffer.position += 1
+    else:
+        while True:
+            yield buffer.decode(raw_decode)
+            if buffer.expect(',]') == ']':
+                break
+    if buffer.peek():
+        raise ValueError('Extra data after the array')
+
+
+def iter_ndjson(stream, block_size=STREAM_BLOCK_SIZE):
+    '''Generate the newline-delimited JSON documents read from stream.'''
+    buffer = TextBuffer(stream, block_size)
+    raw_decode = json.JSONDecoder().raw_decode
+    while buffer.peek():
+        yield buffer.decode(raw_decode)
+
+
+def get_item_validator(validator):
+    '''Return a validator for the items of the schema of validator (or None).
+
+    References are resolved against the full schema.
+    '''
+    items = validator.schema.get('items')
+    if not isinstance(items, dict):
+        return None
+    return type(validator)(items, resolver=validator.resolver)
+
+
+def stream_json(request, name, validator=None):
+    '''Generate the items of the JSON body of request, parsed incrementally.
+
+    Raise BadRequest (naming parameter `name`) on malformed JSON and, if a
+    validator is given, on invalid items.
+    '''
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = iter_ndjson(request.stream)
+    else:
+        items = iter_array(request.stream)
+    try:
+        for index, item in enumerate(items):
+            if validator is not None:
+                error = best_match(validator.iter_errors(item))
+                if error is not None:
+                    path = (index,) + tuple(error.path)
+                    location = '/'.join(str(bit) for bit in path)
+                    msg = '{} (at "/{}")'
+                    raise ValueError(msg.format(error.message, location))
+            yield item
+    except ValueError as e:
+        msg = 'Invalid value for parameter "{}": {}'
+        raise BadRequest(msg.format(name, e))
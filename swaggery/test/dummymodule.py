@@ -1,5 +1,9 @@
 '''Dummy functions to be used for testing.'''
 
+import io
+import os
+import threading
+
 from ..utils import RegisterLeafClasses
 from ..keywords import *
 
@@ -21,6 +25,20 @@ class SwaggeryCallingResource(object):
             raise exception_class(status)
         return generator()
 
+    @operations('GET')
+    def test_return(cls, request, status) -> [
+            (200, "OK", Void),
+            (404, "KO", Void)]:
+        yield
+        return Response(status, 'Payload')
+
+    calls = 0
+
+    @operations('GET', cache={'max_entries': 2})
+    def test_cached(cls, request, value) -> [(200, "OK", Void)]:
+        cls.calls += 1
+        return Response(200, value)
+
 
 # #############################################################################
 # OPERATIONS TESTING
@@ -32,6 +50,69 @@ class OperationsClass(object):
         '''BDFL'''
         Respond(404)
 
+    def bar(cls, request) -> [(200, "Ok", Void)]:
+        '''BDFL'''
+        yield
+        return Response(200, 'BDFL')
+
+
+# #############################################################################
+# EXECUTORS TESTING
+# #############################################################################
+
+class ExecutorsClass(object):
+
+    @operations('GET', executor='thread')
+    def in_thread(cls, request, value) -> [(200, "OK", Void)]:
+        yield  # Meaningless, in a thread
+        Respond(200, (value, threading.current_thread().name))
+
+    @operations('GET', executor='process')
+    def in_process(cls, request, value) -> [(200, "OK", Void)]:
+        return Response(200, (item for item in (value, os.getpid())))
+
+
+# #############################################################################
+# LIMITS TESTING
+# #############################################################################
+
+class LimitedClass(object):
+
+    @operations('GET', max_concurrency=1, max_queue=1)
+    def limited(cls, request) -> [(200, "OK", Void)]:
+        yield
+        return Response(200, 'Done')
+
+    @operations('GET', deadline=10)
+    def slow(cls, request) -> [(200, "OK", Void)]:
+        cls.cleaned_up = False
+        try:
+            while True:
+                yield
+        finally:
+            cls.cleaned_up = True
+
+
+# #############################################################################
+# COALESCING TESTING
+# #############################################################################
+
+class CoalescedClass(object):
+
+    calls = 0
+
+    @operations('GET', coalesce=True)
+    def coalesced(cls, request, n) -> [
+            (200, "OK", Void),
+            (404, "KO", Void)]:
+        cls.calls += 1
+        yield
+        if n < 0:
+            Respond(404)
+        if n == 0:
+            return Response(200, io.BytesIO(b'spam'))
+        return Response(200, (i for i in range(n)))
+
 
 # #############################################################################
 # API TESTING
@@ -142,6 +223,20 @@ class SillyModel(Model):
     schema = {}
 
 
+class PointModel(Model):
+
+    schema = {
+        'type': 'object',
+        'properties': {'x': {'type': 'number'}, 'y': {'type': 'number'}},
+        'required': ['x', 'y'],
+    }
+
+
+class PointsModel(Model):
+
+    schema = {'type': 'array', 'items': PointModel.schema}
+
+
 # #############################################################################
 # INJECTION
 # #############################################################################
@@ -172,6 +267,23 @@ def body_func(
     pass
 
 
+def validated_func(
+        noise, more_noise,
+        point: (Ptypes.body, PointModel('A point'))) -> [
+            (200, 'Ok', PointModel)
+        ]:
+    pass
+
+
+def streamed_func(
+        noise, more_noise,
+        points: (Ptypes.body, PointsModel('Some points'))) -> [
+            (200, 'Ok', Void)
+        ]:
+    pass
+streamed_func.stream_body = True
+
+
 def header_func(
         noise, more_noise,
         var_one: (Ptypes.header, String('Token one')),
@@ -181,6 +293,17 @@ def header_func(
     pass
 
 
+def typed_func(
+        noise, more_noise,
+        day: (Ptypes.path, Date('A day')),
+        name: (Ptypes.path, String('A name')),
+        count: (Ptypes.query, Integer('How many')),
+        verbose: (Ptypes.header, Boolean('Be verbose'))) -> [
+            (200, 'Ok', Void)
+        ]:
+    pass
+
+
 def form_func(
         noise, more_noise,
         var_one: (Ptypes.form, String('Name of something')),
@@ -3,11 +3,18 @@
 import unittest
 import unittest.mock as mock
 
-from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import HTTPException, ImATeapot
 from werkzeug.routing import Rule
 
 from .. import api
-from .dummymodule import OperationsClass, DummyAPI, DummyResource
+from ..flowcontrol import Respond
+from ..models import Void
+from .dummymodule import (
+    OperationsClass,
+    DummyAPI,
+    DummyResource,
+    annotated_return,
+)
 
 
 class TestApi(unittest.TestCase):
@@ -37,6 +44,15 @@ class TestResource(unittest.TestCase):
         self.assertEqual(1, len(params))
         self.assertTrue(keys.issubset(set(params[0].keys())))
 
+    def test_bulkhead(self):
+        '''Resources can declare a bulkhead shared by their operations.'''
+        self.assertIsNone(DummyResource.bulkhead)
+        with mock.patch.object(DummyResource, 'max_concurrency', 3):
+            bulkhead = DummyResource.bulkhead
+            self.assertEqual(3, bulkhead.max_concurrency)
+            self.assertIs(bulkhead, DummyResource.bulkhead)
+        del DummyResource._Resource__bulkhead
+
     def test_get_fragment(self):
         '''A Resource swagger fragment has the relevant keys in it.'''
         keys = {'path', 'description', 'operations'}
@@ -116,3 +132,85 @@ class TestOperations(unittest.TestCase):
         with self.assertRaises(HTTPException) as context_manager:
             next(self.decorated(mock.MagicMock(), mock.MagicMock(), 42))
         self.assertEqual(404, context_manager.exception.code)
+
+
+class TestInvalidateCache(unittest.TestCase):
+
+    '''Test the invalidation of the response caches of a resource.'''
+
+    def test_invalidate(self):
+        '''Caches can be invalidated for some operations or all of them.'''
+        caches = [mock.MagicMock(), mock.MagicMock(), None]
+        for cache in caches[:2]:
+            cache.invalidate.return_value = 1
+        callbacks = [mock.MagicMock(cache=cache) for cache in caches]
+        for name, callback in zip(('foo', 'bar', 'spam'), callbacks):
+            callback.__name__ = name
+        with mock.patch.object(DummyResource, 'callbacks', callbacks):
+            self.assertEqual(2, DummyResource.invalidate_cache(param=42))
+            self.assertEqual(1, DummyResource.invalidate_cache('bar'))
+        caches[0].invalidate.assert_called_once_with(param=42)
+        caches[1].invalidate.assert_called_with()
+
+
+class TestOperationsReturn(unittest.TestCase):
+
+    '''Test the return-value protocol of the operations decorator.'''
+
+    def test_return_response(self):
+        '''@operations() hands back returned Response objects.'''
+        class Holder(object):
+            bar = api.operations('GET')(OperationsClass.bar)
+        coroutine = Holder.bar(mock.MagicMock(), mock.MagicMock())
+        next(coroutine)
+        with self.assertRaises(StopIteration) as context_manager:
+            next(coroutine)
+        response = context_manager.exception.value
+        self.assertEqual((200, 'BDFL'), (response.status, response.payload))
+        self.assertEqual('Ok', response.description)
+
+    def test_not_modified(self):
+        '''Unlisted 304 responses are let through as successful ones.'''
+        def baz(cls, request) -> [(200, 'Ok', Void)]:
+            Respond(304, etag='v1')
+
+        class Holder(object):
+            bar = api.operations('GET')(baz)
+        coroutine = Holder.bar(mock.MagicMock(), mock.MagicMock())
+        with self.assertRaises(StopIteration) as context_manager:
+            next(coroutine)
+        response = context_manager.exception.value
+        self.assertEqual((304, 'v1'), (response.status, response.etag))
+        self.assertEqual('Not Modified', response.description)
+
+
+class TestResponseTable(unittest.TestCase):
+
+    '''Test the compiled tables of response messages.'''
+
+    def test_content(self):
+        '''Codes map onto (message, model name, exception class).'''
+        expected = {200: ('Message', 'string', None),
+                    418: ('I tea', 'integer', ImATeapot)}
+        self.assertEqual(expected, dict(api.compile_response_table(
+            annotated_return)))
+
+    def test_immutable(self):
+        '''Tables cannot be modified.'''
+        table = api.compile_response_table(annotated_return)
+        with self.assertRaises(TypeError):
+            table[500] = ('Oops', 'void', None)
+
+    def test_malformed(self):
+        '''Malformed annotations result in empty tables.'''
+        def function() -> 'wrong':
+            pass
+        self.assertEqual({}, dict(api.compile_response_table(function)))
+
+    def test_unknown_error(self):
+        '''Error codes unknown to werkzeug get an ad-hoc exception.'''
+        def function() -> [(599, 'Weird')]:
+            pass
+        _, _, exception = api.compile_response_table(function)[599]
+        self.assertTrue(issubclass(exception, HTTPException))
+        self.assertEqual(599, exception.code)
@@ -2,12 +2,18 @@
 
 import os
 import json
+import time
 import unittest
 import unittest.mock as mock
 
+from werkzeug.routing import Rule
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
 from .. import application as app
-from ..flowcontrol import Respond
-from .dummymodule import SwaggeryCallingResource
+from .. import routing
+from ..flowcontrol import Respond, Response
+from .dummymodule import SwaggeryCallingResource, PointModel
 
 
 THIS_DIR = os.path.dirname(__file__)
@@ -28,7 +34,7 @@ class TestSwaggeryMethods(unittest.TestCase):
 
     def test_mount_resources(self):
         '''Mounting builds the route mapping and register with werzeug.'''
-        with mock.patch.object(app, 'Map') as mock_map:
+        with mock.patch.object(routing, 'Map') as mock_map:
             instance = app.Swaggery([ASYNC_API_DIR])
             registered_keys = len([k for k in instance.callback_map.keys()
                                    if k.startswith('Async')])
@@ -37,24 +43,228 @@ class TestSwaggeryMethods(unittest.TestCase):
 
     @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
     @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
-    def test_get_coroutine(self):
-        '''URL is routed to a coroutine that gets initialised too.'''
+    def test_dispatch(self):
+        '''URL is routed to a callback, and its arguments are extracted.'''
         application = app.Swaggery(['spam'], False)
         # Test objects
-        mock_cb = mock.MagicMock()
-        mock_url_map = mock.MagicMock()
+        mock_cb = mock.MagicMock(max_body_size=None)
+        mock_extractor = mock.MagicMock()
+        mock_router = mock.MagicMock()
         mock_environ = mock.MagicMock()
-        mock_start_response = mock.MagicMock()
         kwargs = {}
         # Behaviorus
-        mock_url_map.bind_to_environ().match.return_value = ('foo', kwargs)
-        application.url_map = mock_url_map
+        mock_router.match.return_value = ('foo', kwargs)
+        application.router = mock_router
         application.callback_map = {'foo': mock_cb}
+        application.extractor_map = {'foo': mock_extractor}
         # Tests
-        with mock.patch.object(app, 'inject_extra_args') as mock_inject:
-            application._get_coroutine(mock_environ, mock_start_response)
-        mock_inject.assert_called_once_with(mock_cb, mock_environ, kwargs)
-        mock_cb.assert_called_once_with(mock_environ, mock_start_response)
+        self.assertEqual((mock_cb, kwargs),
+                         application._dispatch(mock_environ))
+        mock_extractor.assert_called_once_with(mock_environ, kwargs)
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_route_cache(self):
+        '''Parametric matches are cached, and copied before being returned.'''
+        application = app.Swaggery(['spam'], False, route_cache_size=10)
+        application.router = mock.MagicMock()
+        application.router.match.return_value = ('foo', {'bar': 'spam'})
+        request = mock.MagicMock(method='GET', path='/foo/spam')
+        first = application._match(request)
+        first[1]['extra'] = 'injected'
+        second = application._match(request)
+        self.assertEqual(('foo', {'bar': 'spam'}), second)
+        self.assertEqual(1, application.router.match.call_count)
+        stats = application.get_stats()['route_cache']
+        self.assertEqual((1, 1), (stats['hits'], stats['misses']))
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_route_cache_static(self):
+        '''Static routes bypass the route cache, and its statistics.'''
+        for engine in routing.ROUTERS.values():
+            application = app.Swaggery(['spam'], False, route_cache_size=10)
+            application.router = engine(
+                [Rule('/foo', endpoint='foo', methods=['GET'])])
+            request = Request(EnvironBuilder(path='/foo').get_environ())
+            for _ in range(3):
+                self.assertEqual(('foo', {}), application._match(request))
+            stats = application.get_stats()['route_cache']
+            self.assertEqual((0, 0, 0), (
+                stats['hits'], stats['misses'], stats['size']))
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_json_profile(self):
+        '''The JSON profile is per application, but `?pretty=` overrides.'''
+        application = app.Swaggery(['spam'], False)
+        for query, expected in (({}, 'compact'),
+                                ({'pretty': '1'}, 'pretty'),
+                                ({'pretty': '0'}, 'compact')):
+            request = mock.MagicMock(args=query)
+            self.assertEqual(expected, application._get_json_profile(request))
+        with self.assertRaises(ValueError):
+            app.Swaggery(['spam'], False, json_profile='nonexistent')
+
+
+class TestSwaggeryScheduler(unittest.TestCase):
+
+    '''Test the scheduling of the operations.'''
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_scheduled(self):
+        '''Operations are driven by the scheduler, if any.'''
+        application = app.Swaggery(['spam'], False, scheduler='weighted')
+        callback = SwaggeryCallingResource.test_return
+        application._dispatch = mock.MagicMock(
+            return_value=(callback, {'status': 200}))
+        environ = EnvironBuilder().get_environ()
+        chunks = application(environ, mock.MagicMock())
+        self.assertEqual(b'"Payload"', b''.join(c for c in chunks if c))
+        stats = application.get_stats()['scheduler']
+        self.assertEqual(('weighted', 1, 2),
+                         (stats['policy'], stats['requests'], stats['steps']))
+        application = app.Swaggery(['spam'], False)
+        self.assertNotIn('scheduler', application.get_stats())
+
+
+class TestSwaggeryShedding(unittest.TestCase):
+
+    '''Test the load shedding.'''
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_shed(self):
+        '''Sojourn times are recorded, and low priority requests shed.'''
+        application = app.Swaggery(['spam'], False, shedding_target=0.5)
+        application._match = mock.MagicMock(return_value=('ep', {}))
+        application.callback_map = {'ep': mock.MagicMock()}
+        application.extractor_map = {'ep': None}
+        application.priorities = {'ep': -1}
+        application.shedder.dropping = True
+        stamp = 't={}'.format(time.time() - 10)
+        environ = EnvironBuilder(headers={'X-Request-Start': stamp})
+        start_response = mock.MagicMock()
+        list(application(environ.get_environ(), start_response))
+        status, headers = start_response.call_args[0]
+        self.assertTrue(status.startswith('503'))
+        self.assertIn(('Retry-After', '1'), headers)
+        stats = application.get_stats()['shedder']
+        self.assertEqual(1, stats['shed'])
+        self.assertTrue(stats['dropping'])
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_keep_dropping(self):
+        '''Shed requests do not count as fast ones, so shedding goes on.'''
+        application = app.Swaggery(['spam'], False, shedding_target=0.5,
+                                   shedding_interval=1e-9)
+        application._match = mock.MagicMock(return_value=('ep', {}))
+        application.callback_map = {'ep': mock.MagicMock()}
+        application.extractor_map = {'ep': None}
+        application.priorities = {'ep': 0}
+        application.shedder.dropping = True
+        start_response = mock.MagicMock()
+        for _ in range(5):
+            environ = EnvironBuilder().get_environ()
+            list(application(environ, start_response))
+            status, _ = start_response.call_args[0]
+            self.assertTrue(status.startswith('503'))
+        stats = application.get_stats()['shedder']
+        self.assertEqual((5, 0, True), (
+            stats['shed'], stats['admitted'], stats['dropping']))
+
+
+class TestSwaggeryBodyLimits(unittest.TestCase):
+
+    '''Test the limits on the size of request bodies.'''
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_too_large(self):
+        '''Bodies larger than the limit are rejected before extraction.'''
+        application = app.Swaggery(['spam'], False, max_body_size=10)
+        application._match = mock.MagicMock(return_value=('ep', {}))
+        extractor = mock.MagicMock()
+        application.callback_map = {'ep': SwaggeryCallingResource.test}
+        application.extractor_map = {'ep': extractor}
+        start_response = mock.MagicMock()
+        environ = EnvironBuilder(method='POST', data='x' * 11).get_environ()
+        list(application(environ, start_response))
+        self.assertTrue(start_response.call_args[0][0].startswith('413'))
+        self.assertFalse(extractor.called)
+        self.assertEqual(1, application.get_stats()['bodies']['rejected'])
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_read_limit(self):
+        '''The read limit is the one of the operation routed to.'''
+        application = app.Swaggery(['spam'], False, max_body_size=10)
+        application.router = routing.WerkzeugRouter([
+            Rule('/small', endpoint='small'), Rule('/any', endpoint='any')])
+        application.callback_map = {
+            'small': mock.MagicMock(max_body_size=4),
+            'any': mock.MagicMock(max_body_size=None)}
+        application.max_read_size = 10
+        for path, expected in (('/small', 4), ('/any', 10), ('/none', 10)):
+            request = Request(EnvironBuilder(path=path).get_environ())
+            self.assertEqual(expected, application.get_read_limit(request))
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    def test_max_read_size(self):
+        '''Reads are bounded if all the operations have a limit.'''
+        operation = mock.MagicMock(max_body_size=4, cache=None,
+                                   bulkhead=None, flights=None)
+        resource = mock.MagicMock(bulkhead=None)
+        resource.get_routing_tuples.side_effect = lambda: [
+            (Rule('/small', endpoint='small'), operation)]
+        with mock.patch.object(app, 'Resource', [resource]):
+            application = app.Swaggery(['spam'], False)
+            self.assertEqual(4, application.max_read_size)
+            operation.max_body_size = None
+            application._mount_resources()
+            self.assertIsNone(application.max_read_size)
+
+
+class TestSwaggeryValidation(unittest.TestCase):
+
+    '''Test the validation of the responses.'''
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def test_invalid_response(self):
+        '''Payloads not matching their model are an internal error.'''
+        application = app.Swaggery(['spam'], False, validate_responses=True)
+        callback = SwaggeryCallingResource.test_return
+        application._dispatch = mock.MagicMock(
+            return_value=(callback, {'status': 200}))
+        environ = EnvironBuilder().get_environ()
+        start_response = mock.MagicMock()
+        list(application(environ, start_response))
+        self.assertTrue(start_response.call_args[0][0].startswith('200'))
+        application.response_validators[callback] = {
+            200: PointModel.validator}
+        list(application(environ, start_response))
+        self.assertTrue(start_response.call_args[0][0].startswith('500'))
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    def test_remount(self):
+        '''Response validators are rebuilt at each mount.'''
+        application = app.Swaggery(['spam'], False, validate_responses=True)
+        stale = mock.MagicMock()
+        application.response_validators[stale] = {200: PointModel.validator}
+        application._mount_resources()
+        self.assertNotIn(stale, application.response_validators)
+
+    def test_get_validators(self):
+        '''Validators are collected for the responses with a schema.'''
+        validators = app.get_validators(SwaggeryCallingResource.test_return)
+        self.assertEqual({}, validators)
+        validated = mock.MagicMock(response_table={
+            200: ('Ok', 'PointModel', None), 404: ('KO', 'void', None)})
+        validators = app.get_validators(validated)
+        self.assertEqual({200: PointModel.validator}, validators)
 
 
 class TestSwaggeryCalling(unittest.TestCase):
@@ -64,14 +274,19 @@ class TestSwaggeryCalling(unittest.TestCase):
     @mock.patch.object(app, 'Request', mock.MagicMock())
     @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
     @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
-    @mock.patch.object(app.Swaggery, '_get_coroutine')
-    def _run_test_call(self, exception_class, status, tester, mock_getco):
+    @mock.patch.object(app.Swaggery, '_dispatch')
+    def _run_test_call(self, exception_class, status, tester, mock_dispatch):
         '''Helper function to run a call mocking the hell out of it.'''
-        mock_getco.return_value = SwaggeryCallingResource.test(
-            mock.MagicMock(),
-            mock.MagicMock(),
-            exception_class=exception_class,
-            status=status)
+        if exception_class is Response:
+            coroutine = SwaggeryCallingResource.test_return(
+                mock.MagicMock(), mock.MagicMock(), status=status)
+        else:
+            coroutine = SwaggeryCallingResource.test(
+                mock.MagicMock(),
+                mock.MagicMock(),
+                exception_class=exception_class,
+                status=status)
+        mock_dispatch.return_value = (lambda *args: coroutine, {})
         application = app.Swaggery(['spam'], False)(None, mock.MagicMock())
         while True:
             value = next(application)
@@ -91,7 +306,67 @@ class TestSwaggeryCalling(unittest.TestCase):
         tester = lambda v: self.assertEqual(expected, json.loads(v.decode()))
         self._run_test_call(Respond, 404, tester)
 
+    def test_call_return_win(self):
+        '''Returning a Response yields a valid Win response.'''
+        expected = 'Payload'
+        tester = lambda v: self.assertEqual(expected, json.loads(v.decode()))
+        self._run_test_call(Response, 200, tester)
+
+    def test_call_return_fail(self):
+        '''Returning a Response yields a valid Fail response.'''
+        expected = {'code': 404, 'message': 'KO'}
+        tester = lambda v: self.assertEqual(expected, json.loads(v.decode()))
+        self._run_test_call(Response, 404, tester)
+
     def test_call_ok(self):
         '''Calling the application can yield a valid Crash response.'''
         tester = lambda v: v.startswith(b'Internal server error: 500.')
         self._run_test_call(RuntimeError, None, tester)
+
+
+class TestSwaggeryResponseCache(unittest.TestCase):
+
+    '''Test the serving of cached responses.'''
+
+    @mock.patch.object(app.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(app.Swaggery, '_mount_resources', mock.MagicMock())
+    def setUp(self):
+        self.application = app.Swaggery(['spam'], False)
+        callback = SwaggeryCallingResource.test_cached
+        callback.cache.clear()
+        SwaggeryCallingResource.calls = 0
+        self.application.response_caches = {'Calling.cached': callback.cache}
+        self.application._dispatch = mock.MagicMock(
+            side_effect=lambda request: (callback, {'value': request.path}))
+
+    def call(self, path, method='GET', **headers):
+        '''Helper function to call the application, return status and body.'''
+        environ = EnvironBuilder(path=path, method=method,
+                                 headers=list(headers.items())).get_environ()
+        start_response = mock.MagicMock()
+        body = b''.join(self.application(environ, start_response))
+        return start_response.call_args[0][0], body
+
+    def test_hit(self):
+        '''Cached responses are served without calling the operation.'''
+        self.assertEqual(('200 OK', b'"/spam"'), self.call('/spam'))
+        self.assertEqual(('200 OK', b'"/spam"'), self.call('/spam'))
+        self.assertEqual(('200 OK', b'"/eggs"'), self.call('/eggs'))
+        self.assertEqual(2, SwaggeryCallingResource.calls)
+        stats = self.application.get_stats()['response_caches']
+        self.assertEqual(1, stats['Calling.cached']['hits'])
+
+    def test_only_get(self):
+        '''Only responses to GET/HEAD requests are cached.'''
+        self.call('/spam', 'POST')
+        self.call('/spam', 'POST')
+        self.assertEqual(2, SwaggeryCallingResource.calls)
+
+    def test_not_modified(self):
+        '''Cached responses are still validated against If-None-Match.'''
+        self.call('/spam')
+        etag = SwaggeryCallingResource.test_cached.cache.get(
+            ((('value', '/spam'), ), ('compact', None))).etag
+        status, body = self.call('/spam', If_None_Match='"{}"'.format(etag))
+        self.assertEqual(('304 NOT MODIFIED', b''), (status, body))
+        self.assertEqual(1, SwaggeryCallingResource.calls)
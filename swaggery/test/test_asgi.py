@@ -0,0 +1,163 @@
+'''Test suite for the asgi module.'''
+
+import asyncio
+import unittest
+import unittest.mock as mock
+
+from werkzeug.exceptions import NotFound
+
+from .. import asgi
+from ..routing import WerkzeugRouter
+from ..api import operations
+from ..flowcontrol import Response
+from ..models import Void
+
+
+class Sleeper(object):
+
+    @operations('GET')
+    def sleep(cls, request) -> [(200, 'Ok', Void)]:
+        future = asyncio.Future()
+        asyncio.get_event_loop().call_soon(future.set_result, 'Awake')
+        result = yield from future
+        yield  # Bare yields are fine too
+        return Response(200, result)
+
+    @operations('GET')
+    def stream(cls, request) -> [(200, 'Ok', Void)]:
+        return Response(200, (letter for letter in 'SPAM'))
+
+
+def make_scope(path='/', method='GET', query=b'', headers=()):
+    '''Helper function to build an HTTP scope.'''
+    return {'type': 'http', 'method': method, 'path': path,
+            'query_string': query, 'headers': list(headers)}
+
+
+class TestBuildEnviron(unittest.TestCase):
+
+    '''Test the conversion of ASGI scopes to WSGI environs.'''
+
+    def test_environ(self):
+        '''Path, query, headers and body are converted.'''
+        scope = make_scope('/caf\xe9', 'POST', b'foo=bar', [
+            (b'content-type', b'application/json'),
+            (b'content-length', b'999'),
+            (b'x-token', b'spam'),
+            (b'x-token', b'eggs')])
+        environ = asgi.build_environ(scope, b'{}')
+        self.assertEqual('POST', environ['REQUEST_METHOD'])
+        self.assertEqual('/caf\xc3\xa9', environ['PATH_INFO'])
+        self.assertEqual('foo=bar', environ['QUERY_STRING'])
+        self.assertEqual('application/json', environ['CONTENT_TYPE'])
+        self.assertEqual('2', environ['CONTENT_LENGTH'])
+        self.assertEqual('spam,eggs', environ['HTTP_X_TOKEN'])
+        self.assertEqual(b'{}', environ['wsgi.input'].read())
+
+
+class TestAsgiSwaggery(unittest.TestCase):
+
+    '''Test the ASGI application.'''
+
+    @mock.patch.object(asgi.Swaggery, '_register_resources', mock.MagicMock())
+    @mock.patch.object(asgi.Swaggery, '_mount_resources', mock.MagicMock())
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.application = asgi.AsgiSwaggery(['spam'], False)
+        self.application.router = WerkzeugRouter([])
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_app(self, scope, incoming=({'type': 'http.request'}, )):
+        '''Helper function to run the application, return sent messages.'''
+        incoming = list(incoming)
+        sent = []
+
+        def done(result=None):
+            future = asyncio.Future(loop=self.loop)
+            future.set_result(result)
+            return future
+
+        def receive():
+            return done(incoming.pop(0))
+
+        def send(message):
+            sent.append(message)
+            return done()
+        self.loop.run_until_complete(
+            self.application(scope, receive, send))
+        return sent
+
+    def test_awaiting(self):
+        '''Operations can wait on asyncio futures.'''
+        self.application._dispatch = mock.MagicMock(
+            return_value=(Sleeper.sleep, {}))
+        start, body, end = self.run_app(make_scope())
+        self.assertEqual(200, start['status'])
+        self.assertIn((b'content-length', b'7'), start['headers'])
+        self.assertEqual(b'"Awake"', body['body'])
+        self.assertEqual((b'', False),
+                         (end['body'], end.get('more_body', False)))
+
+    def test_streaming(self):
+        '''Generator payloads are streamed in several body messages.'''
+        self.application._dispatch = mock.MagicMock(
+            return_value=(Sleeper.stream, {}))
+        self.application.response_options['chunk_size'] = 1
+        sent = self.run_app(make_scope())
+        bodies = [message['body'] for message in sent[1:]]
+        self.assertLess(2, len(bodies))
+        self.assertEqual(b'["S",\n"P",\n"A",\n"M"]', b''.join(bodies))
+
+    def test_body_limit(self):
+        '''Bodies are read up to the limit, then rejected.'''
+        self.application.max_read_size = 4
+        self.application.body_limiter.max_size = 4
+        self.application._match = mock.MagicMock(return_value=('ep', {}))
+        self.application.callback_map = {'ep': Sleeper.sleep}
+        self.application.extractor_map = {'ep': None}
+        incoming = [{'type': 'http.request', 'body': b'spa', 'more_body': True}
+                    for _ in range(3)]
+        sent = self.run_app(make_scope(method='POST'), incoming)
+        self.assertEqual(413, sent[0]['status'])
+
+    def test_operation_body_limit(self):
+        '''Bodies are read up to the limit of the operation routed to.'''
+        self.application.router = mock.MagicMock()
+        self.application.router.match.return_value = ('ep', {})
+        self.application.callback_map = {'ep': mock.MagicMock(max_body_size=4)}
+        self.application.extractor_map = {'ep': None}
+        incoming = [{'type': 'http.request', 'body': b'spa', 'more_body': True}
+                    for _ in range(3)]
+        with mock.patch.object(asgi, 'read_body',
+                               wraps=asgi.read_body) as mock_read:
+            sent = self.run_app(make_scope(method='POST'), incoming)
+        mock_read.assert_called_once_with(mock.ANY, 4)
+        self.assertEqual(413, sent[0]['status'])
+
+    def test_errors(self):
+        '''HTTP errors are reported as usual.'''
+        self.application._dispatch = mock.MagicMock(side_effect=NotFound)
+        sent = self.run_app(make_scope('/nowhere'))
+        self.assertEqual(404, sent[0]['status'])
+
+    def test_request_body(self):
+        '''The request body is buffered before dispatching.'''
+        def dispatch(request):
+            self.assertEqual(b'spameggs', request.get_data())
+            return Sleeper.sleep, {}
+        self.application._dispatch = dispatch
+        self.run_app(make_scope(method='POST'), [
+            {'type': 'http.request', 'body': b'spam', 'more_body': True},
+            {'type': 'http.request', 'body': b'eggs'}])
+
+    def test_lifespan(self):
+        '''Startup and shutdown are acknowledged.'''
+        sent = self.run_app({'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        self.assertEqual(['lifespan.startup.complete',
+                          'lifespan.shutdown.complete'],
+                         [message['type'] for message in sent])
@@ -0,0 +1,175 @@
+'''Test suite for the caching module.'''
+
+import unittest
+import unittest.mock as mock
+
+from werkzeug.exceptions import NotFound
+
+from .. import caching
+from .dummymodule import CoalescedClass
+
+
+def make_response(data):
+    '''Helper function to build a fake encoded response.'''
+    return mock.MagicMock(data=data)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    '''Test the ResponseCache class.'''
+
+    def test_key(self):
+        '''Keys are made of the key parameters plus the variant.'''
+        cache = caching.ResponseCache(key=('foo', ))
+        key = cache.make_key({'foo': 1, 'bar': 2}, 'gzip')
+        self.assertEqual(((('foo', 1), ), 'gzip'), key)
+        cache = caching.ResponseCache()
+        key = cache.make_key({'foo': 1, 'bar': 2}, None)
+        self.assertEqual(((('bar', 2), ('foo', 1)), None), key)
+
+    def test_uncacheable(self):
+        '''Calls with unhashable key parameters cannot be cached.'''
+        cache = caching.ResponseCache()
+        self.assertIsNone(cache.make_key({'body': {'foo': 1}}, None))
+
+    @mock.patch.object(caching, 'monotonic')
+    def test_ttl(self, mock_monotonic):
+        '''Entries older than the time-to-live are discarded.'''
+        mock_monotonic.return_value = 100
+        cache = caching.ResponseCache(ttl=10)
+        response = make_response(b'spam')
+        cache.put('foo', response)
+        mock_monotonic.return_value = 109
+        self.assertIs(response, cache.get('foo'))
+        mock_monotonic.return_value = 110
+        self.assertIsNone(cache.get('foo'))
+        self.assertEqual((0, 1), (len(cache), cache.expirations))
+
+    def test_max_bytes(self):
+        '''Oldest entries are evicted to stay within the byte budget.'''
+        cache = caching.ResponseCache(max_bytes=10)
+        cache.put('foo', make_response(b'x' * 6))
+        cache.put('bar', make_response(b'x' * 4))
+        cache.put('spam', make_response(b'x' * 3))
+        cache.put('eggs', make_response(b'x' * 11))  # Never fits
+        self.assertEqual(['bar', 'spam'], list(cache._data))
+        self.assertEqual((7, 1), (cache.bytes, cache.evictions))
+
+    def test_invalidate(self):
+        '''Entries can be invalidated by key parameters, or all at once.'''
+        cache = caching.ResponseCache()
+        for foo in (1, 2):
+            for variant in ('gzip', None):
+                key = cache.make_key({'foo': foo, 'bar': 0}, variant)
+                cache.put(key, make_response(b'spam'))
+        self.assertEqual(2, cache.invalidate(foo=1))
+        self.assertEqual(0, cache.invalidate(foo=3))
+        self.assertEqual(2, cache.invalidate())
+        self.assertEqual((0, 0), (len(cache), cache.bytes))
+        self.assertEqual(4, cache.stats['invalidations'])
+
+
+class TestMakeResponseCache(unittest.TestCase):
+
+    '''Test the make_response_cache function.'''
+
+    def test_options(self):
+        '''Caches can be declared with True, a dictionary or an instance.'''
+        cache = caching.make_response_cache(True)
+        self.assertEqual(caching.DEFAULT_MAX_ENTRIES, cache.maxsize)
+        cache = caching.make_response_cache({'ttl': 5, 'max_entries': 3})
+        self.assertEqual((5, 3), (cache.ttl, cache.maxsize))
+        self.assertIs(cache, caching.make_response_cache(cache))
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    '''Test the SingleFlight class, via a coalescing operation.'''
+
+    def setUp(self):
+        CoalescedClass.calls = 0
+        self.request = mock.MagicMock(method='GET')
+
+    def call(self, n):
+        '''Helper function returning a call to the coalescing operation.'''
+        return CoalescedClass.coalesced(self.request, mock.MagicMock(), n=n)
+
+    def run_call(self, call):
+        '''Helper function running a call to completion.'''
+        try:
+            while True:
+                next(call)
+        except StopIteration as e:
+            return e.value
+
+    def test_fan_out(self):
+        '''Concurrent identical calls share a single (streamed) result.'''
+        flights = CoalescedClass.coalesced.flights
+        before = flights.stats
+        leader, follower, other = self.call(3), self.call(3), self.call(2)
+        for call in (leader, follower, other):
+            next(call)
+        results = [self.run_call(call) for call in (leader, follower, other)]
+        self.assertEqual(2, CoalescedClass.calls)
+        self.assertEqual([[0, 1, 2], [0, 1, 2], [0, 1]],
+                         [list(result.payload) for result in results])
+        self.assertEqual('OK', results[1].description)
+        stats = {name: value - before[name]
+                 for name, value in flights.stats.items()}
+        self.assertEqual((2, 1, 1), (
+            stats['leaders'], stats['followers'], stats['shared']))
+        self.assertEqual(0, flights.stats['in_flight'])
+
+    def test_abandoned_follower(self):
+        '''Followers abandoning the wait get no share of the result.'''
+        flights = CoalescedClass.coalesced.flights
+        leader, quitter, follower = self.call(4), self.call(4), self.call(4)
+        for call in (leader, quitter, follower):
+            next(call)
+        flight, = flights.flights.values()
+        self.assertEqual(2, flight.followers)
+        quitter.close()
+        self.assertEqual(1, flight.followers)
+        with mock.patch.object(caching, 'tee', wraps=caching.tee) as mock_tee:
+            results = [self.run_call(call) for call in (leader, follower)]
+        mock_tee.assert_called_once_with(mock.ANY, 2)
+        self.assertEqual([[0, 1, 2, 3]] * 2,
+                         [list(result.payload) for result in results])
+        self.assertEqual([], flight.results)
+
+    def test_errors(self):
+        '''Errors of the leading call are shared with the followers.'''
+        leader, follower = self.call(-1), self.call(-1)
+        next(leader)
+        next(follower)
+        for call in (leader, follower):
+            with self.assertRaises(NotFound):
+                self.run_call(call)
+        self.assertEqual(1, CoalescedClass.calls)
+
+    def test_files(self):
+        '''Files cannot be shared, so followers run the operation again.'''
+        leader, follower = self.call(0), self.call(0)
+        next(leader)
+        next(follower)
+        results = [self.run_call(call) for call in (leader, follower)]
+        self.assertIsNot(results[0].payload, results[1].payload)
+        self.assertEqual(2, CoalescedClass.calls)
+
+    def test_abandon(self):
+        '''If the leading call is aborted, a follower takes over.'''
+        leader, follower = self.call(1), self.call(1)
+        next(leader)
+        next(follower)
+        leader.close()
+        self.assertEqual([0], list(self.run_call(follower).payload))
+        self.assertEqual(2, CoalescedClass.calls)
+
+    def test_unsafe(self):
+        '''Only GET (and HEAD) requests are coalesced.'''
+        self.request.method = 'POST'
+        calls = [self.call(1), self.call(1)]
+        for call in calls:
+            next(call)
+            self.run_call(call)
+        self.assertEqual(2, CoalescedClass.calls)
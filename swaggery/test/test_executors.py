@@ -0,0 +1,99 @@
+'''Test suite for the executors module.'''
+
+import os
+import threading
+import unittest
+
+from .. import executors
+from ..testlib import call_endpoint
+from .dummymodule import ExecutorsClass
+
+
+def drive(generator):
+    '''Helper function to drive a generator to completion, return its value.'''
+    try:
+        while True:
+            next(generator)
+    except StopIteration as e:
+        return e.value
+
+
+def fail():
+    raise KeyError('Spam')
+
+
+class TestPool(unittest.TestCase):
+
+    '''Test the Pool class.'''
+
+    def setUp(self):
+        self.pool = executors.Pool('thread', 2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_kinds(self):
+        '''Only known executors can be used.'''
+        with self.assertRaises(ValueError):
+            executors.Pool('gpu')
+
+    def test_run(self):
+        '''Functions are run in the pool, and their results returned.'''
+        result = drive(self.pool.run(threading.current_thread))
+        self.assertIsNot(threading.current_thread(), result)
+        stats = self.pool.stats
+        self.assertEqual((1, 1, 0, 0), (stats['submitted'], stats['completed'],
+                                        stats['failed'], stats['pending']))
+        self.assertEqual(0, stats['saturation'])
+        self.assertLessEqual(0, stats['max_queue_time'])
+
+    def test_failure(self):
+        '''Exceptions are propagated, and counted.'''
+        with self.assertRaises(KeyError):
+            drive(self.pool.run(fail))
+        self.assertEqual(1, self.pool.stats['failed'])
+
+    def test_saturation(self):
+        '''Saturation is the ratio of pending jobs to workers.'''
+        event = threading.Event()
+        runs = [self.pool.run(event.wait) for _ in range(3)]
+        for run in runs:
+            next(run)
+        self.assertEqual(1.5, self.pool.stats['saturation'])
+        event.set()
+        self.assertEqual([True] * 3, [drive(run) for run in runs])
+        self.assertEqual(3, self.pool.stats['max_pending'])
+
+
+class TestOffloading(unittest.TestCase):
+
+    '''Test the offloading of functions and operations.'''
+
+    def tearDown(self):
+        executors.configure()
+
+    def test_offload(self):
+        '''Functions can be offloaded from within operations.'''
+        result = drive(executors.offload(int, '11', base=2))
+        self.assertEqual(3, result)
+        self.assertIn('thread', executors.get_stats())
+        self.assertNotIn('process', executors.get_stats())
+
+    def test_configure(self):
+        '''Pools can be resized.'''
+        executors.configure(thread_workers=3)
+        self.assertEqual(3, executors.POOLS['thread'].max_workers)
+        self.assertEqual(executors.DEFAULT_WORKERS['process'],
+                         executors.POOLS['process'].max_workers)
+
+    def test_thread_operation(self):
+        '''Operations can be run in a thread pool.'''
+        value, thread = call_endpoint(ExecutorsClass.in_thread, value='spam')
+        self.assertEqual('spam', value)
+        self.assertNotEqual(threading.current_thread().name, thread)
+
+    def test_process_operation(self):
+        '''Operations can be run in a process pool.'''
+        value, pid = call_endpoint(ExecutorsClass.in_process, value='spam')
+        self.assertEqual('spam', value)
+        self.assertNotEqual(os.getpid(), pid)
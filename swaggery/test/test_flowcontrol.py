@@ -2,7 +2,9 @@
 
 import unittest
 
-from ..flowcontrol import Respond
+import unittest.mock as mock
+
+from ..flowcontrol import Respond, Response, check_etag
 
 
 class TestRespond(unittest.TestCase):
@@ -27,3 +29,41 @@ class TestRespond(unittest.TestCase):
             Respond(200)
         except Respond as e:
             self.assertIsNone(e.payload)
+
+
+class TestResponse(unittest.TestCase):
+
+    '''Test the Response object.'''
+
+    def test_no_raise(self):
+        '''Instantiating a Response does not raise anything.'''
+        response = Response(200, 'Dummy Payload')
+        self.assertEqual((200, 'Dummy Payload'),
+                         (response.status, response.payload))
+
+    def test_arguments_no_payload(self):
+        '''Payload is set to None in the Response, if not given.'''
+        self.assertIsNone(Response(200).payload)
+
+
+class TestCheckEtag(unittest.TestCase):
+
+    '''Test the check_etag short-circuit.'''
+
+    def test_match(self):
+        '''A 304 is raised, if the client has the same version.'''
+        request = mock.MagicMock(method='GET')
+        request.if_none_match.contains_weak.return_value = True
+        with self.assertRaises(Respond) as context_manager:
+            check_etag(request, 'v1')
+        self.assertEqual((304, 'v1'), (context_manager.exception.status,
+                                       context_manager.exception.etag))
+
+    def test_no_match(self):
+        '''Nothing happens if the version differs or the method is unsafe.'''
+        request = mock.MagicMock(method='GET')
+        request.if_none_match.contains_weak.return_value = False
+        check_etag(request, 'v1')
+        request = mock.MagicMock(method='PUT')
+        request.if_none_match.contains_weak.return_value = True
+        check_etag(request, 'v1')
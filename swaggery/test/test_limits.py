@@ -0,0 +1,253 @@
+'''Test suite for the limits module.'''
+
+import io
+import unittest
+import unittest.mock as mock
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Request
+
+from .. import limits
+from ..responses import BadResponse
+from .dummymodule import LimitedClass
+
+
+class TestBulkhead(unittest.TestCase):
+
+    '''Test the Bulkhead class.'''
+
+    def test_admission(self):
+        '''Calls are admitted up to the cap, then queued, then rejected.'''
+        bulkhead = limits.Bulkhead(2, max_queue=1)
+        for _ in range(2):
+            self.assertEqual([], list(bulkhead.enter()))
+        waiting = bulkhead.enter()
+        next(waiting)
+        with self.assertRaises(limits.Overloaded):
+            next(bulkhead.enter())
+        next(waiting)  # Still waiting
+        bulkhead.leave()
+        with self.assertRaises(StopIteration):
+            next(waiting)
+        stats = bulkhead.stats
+        self.assertEqual((2, 0, 3, 1, 1), (
+            stats['active'], stats['waiting'], stats['admitted'],
+            stats['queued'], stats['rejected']))
+
+    def test_fifo(self):
+        '''Waiting calls are admitted in order of arrival.'''
+        bulkhead = limits.Bulkhead(1, max_queue=2)
+        list(bulkhead.enter())
+        first, second = bulkhead.enter(), bulkhead.enter()
+        next(first)
+        next(second)
+        bulkhead.leave()
+        next(second)  # Second in line
+        with self.assertRaises(StopIteration):
+            next(first)
+
+    def test_abort(self):
+        '''Aborted calls leave the queue.'''
+        bulkhead = limits.Bulkhead(1, max_queue=1)
+        list(bulkhead.enter())
+        waiting = bulkhead.enter()
+        next(waiting)
+        waiting.close()
+        self.assertEqual(0, bulkhead.stats['waiting'])
+
+    def test_retry_after(self):
+        '''Rejections advise the client when to retry.'''
+        exception = limits.Overloaded('Busy', retry_after=5)
+        response = BadResponse(None, exception)
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('5', dict(response.headers)['Retry-After'])
+
+
+class TestDeadlines(unittest.TestCase):
+
+    '''Test the deadlines of operations.'''
+
+    def test_timeout(self):
+        '''Requests can shorten the deadline, but not extend it.'''
+        request = mock.MagicMock(headers={limits.DEADLINE_HEADER: '2.5'})
+        self.assertEqual(2.5, limits.get_timeout(request, 10))
+        self.assertEqual(1, limits.get_timeout(request, 1))
+        self.assertEqual(2.5, limits.get_timeout(request))
+        for value in ('soon', '-1', 'nan'):
+            request.headers[limits.DEADLINE_HEADER] = value
+            self.assertEqual(10, limits.get_timeout(request, 10))
+        self.assertIsNone(limits.get_timeout(mock.MagicMock(headers={})))
+
+    @mock.patch.object(limits, 'monotonic')
+    def test_enforce(self, mock_monotonic):
+        '''Coroutines past their deadline are closed.'''
+        mock_monotonic.return_value = 100
+        coroutine = mock.MagicMock()
+        coroutine.send.return_value = 'spam'
+        driver = limits.enforce_deadline(coroutine, 5)
+        self.assertEqual('spam', next(driver))
+        mock_monotonic.return_value = 105
+        with self.assertRaises(limits.GatewayTimeout):
+            next(driver)
+        coroutine.close.assert_called_once_with()
+
+    def test_return(self):
+        '''Coroutines completing in time return their value.'''
+        def coroutine():
+            yield 'spam'
+            return 'eggs'
+        driver = limits.enforce_deadline(coroutine(), 5)
+        self.assertEqual('spam', next(driver))
+        with self.assertRaises(StopIteration) as context:
+            next(driver)
+        self.assertEqual('eggs', context.exception.value)
+
+    def test_gateway_timeout(self):
+        '''Cancelled operations are answered with a 504.'''
+        response = BadResponse(None, limits.GatewayTimeout())
+        self.assertEqual(504, response.status_code)
+
+
+class TestLoadShedder(unittest.TestCase):
+
+    '''Test the LoadShedder class.'''
+
+    def setUp(self):
+        patcher = mock.patch.object(limits, 'monotonic', return_value=100)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shedder = limits.LoadShedder(0.5, interval=1)
+
+    def overload(self):
+        '''Helper function keeping the sojourn time above target.'''
+        self.shedder.record(0.6)
+        self.monotonic.return_value += 1
+        self.shedder.record(0.6)
+
+    def test_dropping(self):
+        '''Shedding starts once above target for a whole interval.'''
+        self.shedder.record(0.6)
+        self.monotonic.return_value = 100.5
+        self.shedder.record(0.6)
+        self.assertFalse(self.shedder.dropping)
+        self.monotonic.return_value = 101
+        self.shedder.record(0.6)
+        self.assertTrue(self.shedder.dropping)
+        self.shedder.record(0.1)
+        self.assertFalse(self.shedder.dropping)
+
+    def test_control_law(self):
+        '''Rejections get more frequent while the overload lasts.'''
+        self.overload()
+        with self.assertRaises(limits.Overloaded):
+            self.shedder.admit()
+        self.shedder.admit()  # Pause of 1 / sqrt(1)
+        self.monotonic.return_value += 1
+        with self.assertRaises(limits.Overloaded):
+            self.shedder.admit()
+        self.assertAlmostEqual(1 / 2 ** 0.5,
+                               self.shedder.drop_next - 102)
+
+    def test_priorities(self):
+        '''Negative priorities are shed first, critical ones never.'''
+        self.overload()
+        for _ in range(3):
+            with self.assertRaises(limits.Overloaded):
+                self.shedder.admit(-1)
+            self.shedder.admit(1)
+        self.assertEqual(0, self.shedder.count)
+        stats = self.shedder.stats
+        self.assertEqual((3, 3, 1), (
+            stats['shed'], stats['admitted'], stats['episodes']))
+
+    @mock.patch.object(limits, 'time', return_value=1400000000)
+    def test_arrival(self, mock_time):
+        '''Arrival stamps are in seconds, milliseconds or microseconds.'''
+        request = mock.MagicMock(headers={})
+        for stamp in ('t=1399999999.5', '1399999999500', 't=1399999999500000'):
+            request.headers[limits.REQUEST_START_HEADER] = stamp
+            self.assertEqual(1399999999.5, limits.get_arrival(request))
+        for stamp in ('soon', '-1', '1500000000'):  # The latter from future
+            request.headers[limits.REQUEST_START_HEADER] = stamp
+            self.assertEqual(1400000000, limits.get_arrival(request))
+
+
+class TestBodyLimiter(unittest.TestCase):
+
+    '''Test the BodyLimiter class.'''
+
+    def make_request(self, body, length=True, terminated=False):
+        '''Helper function to build a request with a body.'''
+        environ = {'wsgi.input': io.BytesIO(body)}
+        if length:
+            environ['CONTENT_LENGTH'] = str(len(body))
+        if terminated:
+            environ['wsgi.input_terminated'] = True
+        return Request(environ)
+
+    def test_content_length(self):
+        '''Declared lengths are checked without reading the body.'''
+        limiter = limits.BodyLimiter(4)
+        request = self.make_request(b'spam')
+        limiter.check(request)
+        self.assertEqual(b'spam', request.get_data())
+        request = self.make_request(b'spam!')
+        with self.assertRaises(RequestEntityTooLarge):
+            limiter.check(request)
+        self.assertEqual(0, request.environ['wsgi.input'].tell())
+        limiter.check(self.make_request(b'spam!'), max_size=5)  # Override
+        self.assertEqual((3, 1), (limiter.checked, limiter.rejected))
+
+    def test_unknown_length(self):
+        '''Bodies of unknown length are read up to the limit.'''
+        limiter = limits.BodyLimiter(4)
+        request = self.make_request(b'spam', False, True)
+        limiter.check(request)
+        self.assertEqual(b'spam', request.get_data())
+        request = self.make_request(b'x' * 100, False, True)
+        stream = request.environ['wsgi.input']
+        with self.assertRaises(RequestEntityTooLarge):
+            limiter.check(request)
+        self.assertEqual(5, stream.tell())
+        limiter.check(self.make_request(b'x' * 100, False))  # Not read
+        stats = limiter.stats
+        self.assertEqual((2, 1, 5), (
+            stats['buffered'], stats['rejected'], stats['largest']))
+
+    def test_no_limit(self):
+        '''Without a limit, nothing is checked.'''
+        limiter = limits.BodyLimiter()
+        limiter.check(self.make_request(b'x' * 100))
+        self.assertEqual(0, limiter.checked)
+
+
+class TestLimitedOperations(unittest.TestCase):
+
+    '''Test the limits declared on operations.'''
+
+    def test_operation(self):
+        '''Operations can be guarded by their own bulkhead.'''
+        calls = [LimitedClass.limited(mock.MagicMock(), mock.MagicMock())
+                 for _ in range(3)]
+        next(calls[0])  # Running
+        next(calls[1])  # Queued
+        with self.assertRaises(limits.Overloaded):
+            next(calls[2])
+        for call in calls[:2]:
+            with self.assertRaises(StopIteration):
+                while True:
+                    next(call)
+        self.assertEqual(0, LimitedClass.limited.bulkhead.active)
+
+    @mock.patch.object(limits, 'monotonic')
+    def test_deadline(self, mock_monotonic):
+        '''Operations past their deadline are cancelled and cleaned up.'''
+        mock_monotonic.return_value = 100
+        call = LimitedClass.slow(mock.MagicMock(headers={}), mock.MagicMock())
+        next(call)
+        self.assertFalse(LimitedClass.cleaned_up)
+        mock_monotonic.return_value = 110
+        with self.assertRaises(limits.GatewayTimeout):
+            next(call)
+        self.assertTrue(LimitedClass.cleaned_up)
+        self.assertEqual(10, LimitedClass.slow.deadline)
@@ -2,6 +2,7 @@
 
 import inspect
 import unittest
+from datetime import date, datetime, timedelta, timezone
 
 from .. import models as mm
 
@@ -45,3 +46,58 @@ class TestBaseClass(unittest.TestCase):
         for cls in self.classes:
             instance = cls(test_string)
             self.assertEqual(test_string, instance.description)
+
+
+class TestValidator(unittest.TestCase):
+
+    '''Test the compiled validators of the models.'''
+
+    def test_compiled_once(self):
+        '''Validators are compiled once per model, if it has a schema.'''
+        validator = mm.List.validator
+        self.assertIs(validator, mm.List('Some items').validator)
+        self.assertTrue(validator.is_valid([1, 2]))
+        self.assertFalse(validator.is_valid({}))
+        self.assertIsNone(mm.Integer.validator)
+
+    def test_subclasses(self):
+        '''Subclasses get their own validator.'''
+        mm.List.validator
+        class Numbers(mm.List):
+            schema = {'type': 'array', 'items': {'type': 'number'}}
+        self.assertFalse(Numbers.validator.is_valid(['one']))
+        self.assertTrue(mm.List.validator.is_valid(['one']))
+
+
+class TestCoercion(unittest.TestCase):
+
+    '''Test the parsing of raw values to native types.'''
+
+    def test_numbers(self):
+        '''Numbers are parsed by their python types.'''
+        self.assertEqual(-42, mm.Integer.coerce('-42'))
+        self.assertEqual(0.5, mm.Float.coerce('5e-1'))
+        self.assertIsNone(mm.String.coerce)
+
+    def test_boolean(self):
+        '''Booleans are parsed from the usual (case-insensitive) words.'''
+        for value in ('True', 'yes', 'on', '1'):
+            self.assertIs(True, mm.parse_boolean(value))
+        for value in ('false', 'No', 'OFF', '0'):
+            self.assertIs(False, mm.parse_boolean(value))
+        with self.assertRaises(ValueError):
+            mm.parse_boolean('maybe')
+
+    def test_dates(self):
+        '''Dates and date-times are parsed from ISO 8601.'''
+        self.assertEqual(date(2014, 5, 1), mm.parse_date('2014-05-01'))
+        with self.assertRaises(ValueError):
+            mm.parse_date('2014-13-01')
+        self.assertEqual(datetime(2014, 5, 1, 12, 30, 0, 500000),
+                         mm.parse_datetime('2014-05-01T12:30:00.5'))
+        expected = datetime(2014, 5, 1, 12, 30,
+                            tzinfo=timezone(timedelta(hours=-2)))
+        for value in ('2014-05-01T12:30:00-02:00', '2014-05-01 14:30:00Z'):
+            self.assertEqual(expected, mm.parse_datetime(value))
+        with self.assertRaises(ValueError):
+            mm.parse_datetime('2014-05-01')
@@ -1,11 +1,17 @@
 '''Test suite for the responses module.'''
 
 import json
+import zlib
+import tempfile
 import unittest
 
 import unittest.mock as mock
 from werkzeug.exceptions import InternalServerError, BadRequest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+from werkzeug.wsgi import FileWrapper
 
+from ..flowcontrol import Respond, Response, check_etag
 from ..responses import AsyncResponse, BadResponse, GoodResponse, HEADERS
 from .. import responses
 
@@ -20,6 +26,14 @@ class TestAsync(unittest.TestCase):
         r = AsyncResponse(data)
         self.assertEqual(data, json.loads(r.data.decode()))
 
+    def test_json_profile(self):
+        '''The JSON profile determines the formatting of the payload.'''
+        data = {'foo': 'bar', 'spam': 'eggs'}
+        self.assertEqual(b'{"foo":"bar","spam":"eggs"}',
+                         AsyncResponse(data, json_profile='compact').data)
+        self.assertIn(b'\n    "foo"',
+                      AsyncResponse(data, json_profile='pretty').data)
+
     def test_stream_array(self):
         '''A generator payload's outcome, is an array of jsonified objects.'''
         data = (letter for letter in 'SPAM')
@@ -36,6 +50,13 @@ class TestAsync(unittest.TestCase):
         start_response = mock.MagicMock
         self.assertEqual(expected, b''.join(r.async(None, start_response)))
 
+    def test_status_and_length(self):
+        '''Status line and content length are ready for start_response.'''
+        r = AsyncResponse('spam', status=404)
+        self.assertEqual('404 NOT FOUND', r.status)
+        self.assertEqual('6', dict(r.headers)['Content-Length'])
+        self.assertEqual('599 UNKNOWN', AsyncResponse(None, status=599).status)
+
     def test_async_objects(self):
         '''A single-object response iterate once.'''
         data = {'foo': 'bar'}
@@ -48,12 +69,26 @@ class TestAsync(unittest.TestCase):
     def test_async_generators(self):
         '''A generator response iterate several times.'''
         data = (letter for letter in 'SPAM')
-        r = AsyncResponse(data)
+        r = AsyncResponse(data, chunk_size=1)
         start_response = mock.MagicMock
         for n, bit in enumerate(r.async(None, start_response)):
             pass
         self.assertGreater(n, 1)
 
+    def test_coalesce(self):
+        '''Streamed values are coalesced, but the first one is not delayed.'''
+        data = (letter for letter in 'SPAM')
+        r = AsyncResponse(data, chunk_size=8, flush_interval=None)
+        expected = [b'["S"', b',\n"P",\n"A"', b',\n"M"]']
+        self.assertEqual(expected, list(r.async(None, mock.MagicMock())))
+
+    def test_coalesce_interval(self):
+        '''Buffered values are flushed after flush_interval seconds.'''
+        data = (letter for letter in 'SPAM')
+        r = AsyncResponse(data, flush_interval=0)
+        chunks = list(r.async(None, mock.MagicMock()))
+        self.assertEqual(5, len(chunks))
+
 
 class TestBad(unittest.TestCase):
 
@@ -106,3 +141,216 @@ class TestGood(unittest.TestCase):
         r = GoodResponse(None, mock.MagicMock(status=200, payload=None))
         for header in HEADERS:
             self.assertIn(header, list(r.headers))
+
+    def test_stream_ndjson(self):
+        '''Clients accepting JSON lines get one value per line.'''
+        environ = EnvironBuilder(
+            headers=[('Accept', 'application/x-ndjson')]).get_environ()
+        respond = mock.MagicMock(status=200, payload=(c for c in 'SPAM'))
+        r = GoodResponse(Request(environ), respond)
+        expected = b'"S"\n"P"\n"A"\n"M"\n'
+        self.assertEqual(expected, b''.join(r.async(None, mock.MagicMock())))
+        self.assertTrue(dict(r.headers)['Content-Type'].startswith(
+            'application/x-ndjson'))
+
+    def test_stream_array_default(self):
+        '''Clients not asking for JSON lines get a JSON array.'''
+        environ = EnvironBuilder(headers=[('Accept', '*/*')]).get_environ()
+        respond = mock.MagicMock(status=200, payload=(c for c in 'SPAM'))
+        r = GoodResponse(Request(environ), respond)
+        self.assertEqual('array', r.stream_format)
+
+    def test_stream_ndjson_refused(self):
+        '''Clients refusing JSON lines with "q=0" get a JSON array.'''
+        environ = EnvironBuilder(
+            headers=[('Accept', 'application/x-ndjson;q=0')]).get_environ()
+        respond = mock.MagicMock(status=200, payload=(c for c in 'SPAM'))
+        r = GoodResponse(Request(environ), respond)
+        self.assertEqual('array', r.stream_format)
+
+
+class TestCompression(unittest.TestCase):
+
+    '''Test the compression of responses.'''
+
+    def make_request(self, accept_encoding):
+        '''Helper function to build a request with Accept-Encoding.'''
+        headers = [('Accept-Encoding', accept_encoding)]
+        return Request(EnvironBuilder(headers=headers).get_environ())
+
+    def test_negotiation(self):
+        '''The content-coding is negotiated with the client.'''
+        for header, expected in (('gzip, deflate', 'gzip'),
+                                 ('deflate', 'deflate'),
+                                 ('identity', None),
+                                 ('br', None)):
+            actual = responses.negotiate_encoding(self.make_request(header))
+            self.assertEqual(expected, actual)
+
+    def test_refused(self):
+        '''Content-codings given "q=0" are not acceptable.'''
+        for header, expected in (('gzip;q=0', None),
+                                 ('*;q=0', None),
+                                 ('gzip;q=0, *', 'deflate'),
+                                 ('gzip;q=0, deflate;q=0.5', 'deflate')):
+            actual = responses.negotiate_encoding(self.make_request(header))
+            self.assertEqual(expected, actual)
+
+    def test_threshold(self):
+        '''Only bodies above the threshold are compressed.'''
+        request = self.make_request('gzip')
+        payload = 'x' * 2000
+        big = GoodResponse(request, mock.MagicMock(status=200,
+                                                   payload=payload))
+        small = GoodResponse(request, mock.MagicMock(status=200,
+                                                     payload='x'))
+        self.assertEqual('gzip', dict(big.headers)['Content-Encoding'])
+        self.assertEqual('"{}"'.format(payload).encode(),
+                         zlib.decompress(big.data, 16 + zlib.MAX_WBITS))
+        self.assertNotIn('Content-Encoding', dict(small.headers))
+        self.assertEqual('Accept-Encoding', dict(small.headers)['Vary'])
+
+    def test_opt_out(self):
+        '''Resources can opt out of compression.'''
+        respond = mock.MagicMock(status=200, payload='x' * 2000,
+                                 compress=False)
+        r = GoodResponse(self.make_request('gzip'), respond)
+        self.assertNotIn('Content-Encoding', dict(r.headers))
+
+    def test_stream(self):
+        '''Streams are compressed incrementally.'''
+        respond = mock.MagicMock(status=200, payload=(c for c in 'SPAM'))
+        r = GoodResponse(self.make_request('deflate'), respond, chunk_size=1)
+        chunks = list(r.async(None, mock.MagicMock()))
+        self.assertGreater(len(chunks), 2)
+        decompressor = zlib.decompressobj()
+        first = decompressor.decompress(chunks[0])
+        self.assertEqual(b'["S"', first)  # Decodable as it arrives
+        rest = b''.join(decompressor.decompress(c) for c in chunks[1:])
+        self.assertEqual(b'["S",\n"P",\n"A",\n"M"]', first + rest)
+
+
+class TestConditional(unittest.TestCase):
+
+    '''Test the ETag and conditional GET support.'''
+
+    def make_request(self, method='GET', **headers):
+        '''Helper function to build a request with the given headers.'''
+        headers = [(k.replace('_', '-'), v) for k, v in headers.items()]
+        builder = EnvironBuilder(method=method, headers=headers)
+        return Request(builder.get_environ())
+
+    def test_computed(self):
+        '''Monolithic responses to GET are tagged after their content.'''
+        a = GoodResponse(self.make_request(), Response(200, 'spam'))
+        b = GoodResponse(self.make_request(), Response(200, 'eggs'))
+        c = GoodResponse(self.make_request(), Response(200, 'spam'))
+        self.assertNotEqual(dict(a.headers)['ETag'], dict(b.headers)['ETag'])
+        self.assertEqual(dict(a.headers)['ETag'], dict(c.headers)['ETag'])
+
+    def test_supplied(self):
+        '''Endpoints can supply their own version tag.'''
+        r = GoodResponse(self.make_request(), Response(200, 'spam', 'v1'))
+        self.assertEqual('"v1"', dict(r.headers)['ETag'])
+
+    def test_not_tagged(self):
+        '''Streams and responses to other methods are not tagged.'''
+        stream = Response(200, (c for c in 'SPAM'))
+        for request, respond in ((self.make_request(), stream),
+                                 (self.make_request('POST'),
+                                  Response(200, 'spam'))):
+            r = GoodResponse(request, respond)
+            self.assertNotIn('ETag', dict(r.headers))
+
+    def test_weak_when_compressible(self):
+        '''The tag is weak, when the content may be compressed.'''
+        request = self.make_request(Accept_Encoding='gzip')
+        r = GoodResponse(request, Response(200, 'spam', 'v1'))
+        self.assertEqual('W/"v1"', dict(r.headers)['ETag'])
+
+    def test_not_modified(self):
+        '''Clients having the current version receive an empty 304.'''
+        r = GoodResponse(self.make_request(), Response(200, 'spam'))
+        etag = dict(r.headers)['ETag']
+        request = self.make_request(If_None_Match=etag)
+        r = GoodResponse(request, Response(200, 'spam'))
+        self.assertEqual(304, r.status_code)
+        self.assertEqual(b'', r.data)
+        self.assertEqual(etag, dict(r.headers)['ETag'])
+        r = GoodResponse(request, Response(200, 'eggs'))
+        self.assertEqual(200, r.status_code)
+
+    def test_short_circuit(self):
+        '''Endpoints can respond 304 before computing the payload.'''
+        request = self.make_request(If_None_Match='W/"v1"')
+        with self.assertRaises(Respond) as context_manager:
+            check_etag(request, 'v1')
+        r = GoodResponse(request, context_manager.exception)
+        self.assertEqual(304, r.status_code)
+        self.assertEqual(b'', r.data)
+        self.assertEqual('"v1"', dict(r.headers)['ETag'])
+
+
+class TestRaw(unittest.TestCase):
+
+    '''Test the binary and file payloads.'''
+
+    def setUp(self):
+        self.file = tempfile.TemporaryFile()
+        self.file.write(b'spam and eggs')
+        self.file.seek(5)
+
+    def tearDown(self):
+        self.file.close()
+
+    def write(self, response, environ=None):
+        '''Helper function to write the response, return the written chunks.'''
+        return list(response.async(environ, mock.MagicMock()))
+
+    def test_headers(self):
+        '''Raw payloads have their own content type and are not compressed.'''
+        request = Request(EnvironBuilder(
+            headers=[('Accept-Encoding', 'gzip')]).get_environ())
+        r = GoodResponse(request, Response(200, b'x' * 2000,
+                                           content_type='image/png'))
+        headers = dict(r.headers)
+        self.assertEqual('image/png', headers['Content-Type'])
+        self.assertEqual('2000', headers['Content-Length'])
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('ETag', headers)
+        r = GoodResponse(None, Response(200, b'', etag='v1'))
+        self.assertEqual('application/octet-stream',
+                         dict(r.headers)['Content-Type'])
+        self.assertEqual('"v1"', dict(r.headers)['ETag'])
+
+    def test_bytes(self):
+        '''Bytes are written as they are.'''
+        payload = b'spam'
+        self.assertIs(payload, self.write(AsyncResponse(payload))[0])
+
+    @mock.patch.object(responses, 'RAW_BLOCK_SIZE', 4)
+    def test_buffers(self):
+        '''Buffers are written in blocks.'''
+        r = AsyncResponse(memoryview(bytearray(b'spam and eggs')))
+        self.assertEqual([b'spam', b' and', b' egg', b's'], self.write(r))
+
+    def test_file(self):
+        '''Files are read from their current position, then closed.'''
+        r = AsyncResponse(self.file)
+        self.assertEqual('8', dict(r.headers)['Content-Length'])
+        self.assertEqual(b'and eggs', b''.join(self.write(r)))
+        self.assertTrue(self.file.closed)
+
+    def test_file_wrapper(self):
+        '''Files are handed over to the server's file wrapper.'''
+        environ = {'wsgi.file_wrapper': FileWrapper}
+        r = AsyncResponse(self.file)
+        self.assertEqual(b'and eggs', b''.join(self.write(r, environ)))
+        self.assertTrue(self.file.closed)
+
+    def test_file_wrapper_uwsgi(self):
+        '''The file wrapper itself is yielded to uWSGI, for sendfile().'''
+        environ = {'wsgi.file_wrapper': FileWrapper, 'uwsgi.version': b'2'}
+        chunks = self.write(AsyncResponse(self.file), environ)
+        self.assertEqual(1, len(chunks))
+        self.assertIsInstance(chunks[0], FileWrapper)
@@ -0,0 +1,190 @@
+'''Test suite for the routing module.'''
+
+import unittest
+import unittest.mock as mock
+from datetime import date
+
+from werkzeug.exceptions import (
+    HTTPException,
+    BadRequest,
+    NotFound,
+    MethodNotAllowed,
+)
+from werkzeug.routing import Rule, RequestRedirect
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from .. import routing
+
+
+def make_request(path, method='GET'):
+    '''Helper function to build a request for `path`.'''
+    return Request(EnvironBuilder(path=path, method=method).get_environ())
+
+
+RULES = (
+    ('/api/static', 'Api.static', ['GET']),
+    ('/api/items/<item>', 'Api.item', ['GET', 'PUT']),
+    ('/api/items/special', 'Api.special', ['GET']),
+    ('/api/items/<int:item>/parts/<part>', 'Api.part', ['DELETE']),
+    ('/api/files/<name>.<ext>', 'Api.file', ['GET']),
+    ('/api/folder/', 'Api.folder', ['GET']),
+)
+
+
+def build_rules():
+    '''Helper function to build the test rules (they can bind only once).'''
+    return [Rule(path, endpoint=ep, methods=ms) for path, ep, ms in RULES]
+
+
+class TestWerkzeugRouter(unittest.TestCase):
+
+    '''Test the werkzeug-based router.'''
+
+    def setUp(self):
+        self.router = routing.WerkzeugRouter(build_rules())
+
+    def test_static_table(self):
+        '''Only converter-free rules are indexed (HEAD comes with GET).'''
+        expected = {'/api/static', '/api/items/special', '/api/folder/'}
+        self.assertEqual(expected,
+                         set(path for _, path in self.router.static_routes))
+        self.assertIn(('HEAD', '/api/static'), self.router.static_routes)
+
+    def test_static_match(self):
+        '''Static paths are resolved without binding the werkzeug map.'''
+        with mock.patch.object(self.router, 'url_map') as mock_map:
+            actual = self.router.match(make_request('/api/static'))
+        self.assertEqual(('Api.static', {}), actual)
+        self.assertFalse(mock_map.bind_to_environ.called)
+
+    def test_parametric_match(self):
+        '''Parametric paths are resolved by werkzeug.'''
+        expected = ('Api.item', {'item': '42'})
+        self.assertEqual(expected,
+                         self.router.match(make_request('/api/items/42')))
+
+    def test_errors(self):
+        '''404 and 405 decisions are left to werkzeug.'''
+        with self.assertRaises(NotFound):
+            self.router.match(make_request('/api/nowhere'))
+        with self.assertRaises(MethodNotAllowed):
+            self.router.match(make_request('/api/static', 'POST'))
+
+
+class TestRadixRouter(unittest.TestCase):
+
+    '''Test the radix-tree router.'''
+
+    def setUp(self):
+        self.radix = routing.RadixRouter(build_rules())
+        self.werkzeug = routing.WerkzeugRouter(build_rules())
+
+    def outcome(self, router, path, method):
+        '''Helper function returning a match or the exception class.'''
+        try:
+            return router.match(make_request(path, method))
+        except HTTPException as e:
+            return e.__class__
+
+    def test_same_decisions(self):
+        '''The radix router behaves as werkzeug does.'''
+        paths = ('/api/static', '/api/static/', '/api/items/42',
+                 '/api/items/special', '/api/items/42/parts/foo',
+                 '/api/items/foo/parts/foo', '/api/files/report.pdf',
+                 '/api/files/report', '/api/folder', '/api/folder/',
+                 '/api', '/', '/nowhere/at/all')
+        for path in paths:
+            for method in ('GET', 'HEAD', 'PUT', 'DELETE'):
+                self.assertEqual(self.outcome(self.werkzeug, path, method),
+                                 self.outcome(self.radix, path, method),
+                                 '{} {}'.format(method, path))
+
+    def test_slash_before_method(self):
+        '''The trailing slash redirect takes precedence over 405.'''
+        def rules():
+            return [Rule('/a', endpoint='a', methods=['GET']),
+                    Rule('/a/', endpoint='a_slash', methods=['POST']),
+                    Rule('/b/<x>', endpoint='b', methods=['GET']),
+                    Rule('/b/<x>/', endpoint='b_slash', methods=['POST'])]
+        radix = routing.RadixRouter(rules())
+        werkzeug = routing.WerkzeugRouter(rules())
+        for path in ('/a', '/a/', '/b/1', '/b/1/'):
+            for method in ('GET', 'POST', 'PUT'):
+                self.assertEqual(self.outcome(werkzeug, path, method),
+                                 self.outcome(radix, path, method),
+                                 '{} {}'.format(method, path))
+        self.assertEqual(RequestRedirect, self.outcome(radix, '/a', 'POST'))
+
+    def test_typed_values(self):
+        '''Converters turn path segments into python values.'''
+        expected = ('Api.part', {'item': 42, 'part': 'foo'})
+        request = make_request('/api/items/42/parts/foo', 'DELETE')
+        self.assertEqual(expected, self.radix.match(request))
+
+    def test_redirect(self):
+        '''A missing trailing slash triggers a redirect.'''
+        with self.assertRaises(RequestRedirect) as context_manager:
+            self.radix.match(make_request('/api/folder'))
+        self.assertTrue(
+            context_manager.exception.new_url.endswith('/api/folder/'))
+
+    def test_allowed_methods(self):
+        '''405 responses list the methods available on the path.'''
+        with self.assertRaises(MethodNotAllowed) as context_manager:
+            self.radix.match(make_request('/api/items/42', 'POST'))
+        expected = {'GET', 'HEAD', 'PUT'}
+        self.assertEqual(expected,
+                         set(context_manager.exception.valid_methods))
+
+    def test_path_converter(self):
+        '''Converters spanning several segments are refused.'''
+        with self.assertRaises(ValueError):
+            routing.RadixRouter([Rule('/<path:foo>', endpoint='foo')])
+
+
+class TestConverters(unittest.TestCase):
+
+    '''Test the converters of the native models.'''
+
+    def build_rules(self):
+        '''Helper function to build rules with typed variables.'''
+        return [Rule('/api/<integer:n>/<boolean:flag>', endpoint='Api.typed'),
+                Rule('/api/<date:day>', endpoint='Api.day')]
+
+    def test_engines(self):
+        '''Both engines parse typed variables, or answer 400.'''
+        for engine in routing.ROUTERS.values():
+            router = engine(self.build_rules())
+            self.assertEqual(
+                ('Api.typed', {'n': -3, 'flag': True}),
+                router.match(make_request('/api/-3/yes')))
+            self.assertEqual(
+                ('Api.day', {'day': date(2014, 5, 1)}),
+                router.match(make_request('/api/2014-05-01')))
+            for path in ('/api/3/maybe', '/api/x/yes', '/api/2014-02-30'):
+                with self.assertRaises(BadRequest):
+                    router.match(make_request(path))
+
+    def test_same_decisions(self):
+        '''Converter errors are a 400 in both engines, whatever the method.'''
+        def rules():
+            return [Rule('/f/<integer:n>.json', endpoint='f', methods=['GET']),
+                    Rule('/d/<date:d>/<integer:i>', endpoint='d',
+                         methods=['GET'])]
+
+        def outcome(router, path, method):
+            try:
+                return router.match(make_request(path, method))
+            except HTTPException as e:
+                return e.__class__
+        radix = routing.RadixRouter(rules())
+        werkzeug = routing.WerkzeugRouter(rules())
+        paths = ('/f/1.json', '/f/x.json', '/d/2014-01-01/3',
+                 '/d/2014-13-01/3', '/d/2014-01-01/x', '/d/x/y')
+        for path in paths:
+            for method in ('GET', 'POST', 'DELETE'):
+                self.assertEqual(outcome(werkzeug, path, method),
+                                 outcome(radix, path, method),
+                                 '{} {}'.format(method, path))
+        self.assertEqual(BadRequest, outcome(radix, '/f/x.json', 'POST'))
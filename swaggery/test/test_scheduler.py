@@ -0,0 +1,98 @@
+'''Test suite for the scheduler module.'''
+
+import unittest
+import unittest.mock as mock
+
+from .. import scheduler
+
+
+def coroutine(*values, result='Done'):
+    '''Helper function to build a coroutine yielding `values`.'''
+    for value in values:
+        yield value
+    return result
+
+
+def drive(generator):
+    '''Helper function to drive a generator, return (yielded, result).'''
+    yielded = []
+    try:
+        while True:
+            yielded.append(next(generator))
+    except StopIteration as e:
+        return yielded, e.value
+
+
+class TestScheduler(unittest.TestCase):
+
+    '''Test the Scheduler class.'''
+
+    def test_policies(self):
+        '''Only known policies can be used.'''
+        with self.assertRaises(ValueError):
+            scheduler.Scheduler('lottery')
+
+    def test_passthrough(self):
+        '''Yielded values and the result are passed through.'''
+        sched = scheduler.Scheduler()
+        future = object()
+        yielded, result = drive(sched.run(coroutine(None, future)))
+        self.assertEqual(([None, future], 'Done'), (yielded, result))
+        self.assertEqual((1, 3), (sched.requests, sched.steps))
+
+    @mock.patch.object(scheduler, 'perf_counter')
+    def test_round_robin(self, mock_counter):
+        '''Round-robin scheduling only counts the overruns.'''
+        # Steps lasting 0.05s and 0.001s with a budget of 0.01s
+        mock_counter.side_effect = [0, 0.05, 1, 1.001]
+        sched = scheduler.Scheduler('round-robin', 0.01)
+        yielded, _ = drive(sched.run(coroutine(None)))
+        self.assertEqual([None], yielded)
+        self.assertEqual((1, 0), (sched.overruns, sched.deferrals))
+        self.assertAlmostEqual(0.05, sched.max_step)
+
+    @mock.patch.object(scheduler, 'perf_counter')
+    def test_weighted(self, mock_counter):
+        '''Weighted scheduling defers requests, proportionally to weights.'''
+        mock_counter.side_effect = [0, 0.05, 1, 1.001] * 2
+        sched = scheduler.Scheduler('weighted', 0.01)
+        yielded, _ = drive(sched.run(coroutine(None)))
+        self.assertEqual([None] * 6, yielded)
+        yielded, _ = drive(sched.run(coroutine(None), weight=2))
+        self.assertEqual([None] * 3, yielded)
+        self.assertEqual((2, 7), (sched.overruns, sched.deferrals))
+
+    @mock.patch.object(scheduler, 'perf_counter')
+    def test_max_penalty(self, mock_counter):
+        '''Deferrals are capped.'''
+        mock_counter.side_effect = [0, 100, 100, 100]
+        sched = scheduler.Scheduler('weighted', 0.01)
+        yielded, _ = drive(sched.run(coroutine(None)))
+        self.assertEqual(scheduler.MAX_PENALTY + 1, len(yielded))
+
+    def test_exceptions(self):
+        '''Exceptions are propagated, and thrown ones are forwarded.'''
+        def failing():
+            try:
+                yield
+            except KeyError:
+                return 'Recovered'
+            raise ValueError
+        run = scheduler.Scheduler().run(failing())
+        next(run)
+        with self.assertRaises(StopIteration) as context_manager:
+            run.throw(KeyError)
+        self.assertEqual('Recovered', context_manager.exception.value)
+        run = scheduler.Scheduler().run(failing())
+        next(run)
+        with self.assertRaises(ValueError):
+            next(run)
+
+    def test_close(self):
+        '''Closing the scheduled coroutine closes the operation.'''
+        operation = coroutine(None, None)
+        run = scheduler.Scheduler().run(operation)
+        next(run)
+        run.close()
+        with self.assertRaises(StopIteration):
+            next(operation)
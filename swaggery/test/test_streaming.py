@@ -0,0 +1,144 @@
+'''Test suite for the streaming module.'''
+
+import io
+import json
+import unittest
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from . import dummymodule as dummy
+from .. import streaming
+from ..api import operations
+from ..models import Void
+from ..utils import ArgumentExtractor
+
+
+def make_stream(text):
+    '''Helper function to build a binary stream from text.'''
+    return io.BytesIO(text.encode('utf-8'))
+
+
+class TestIterArray(unittest.TestCase):
+
+    '''Test the incremental parsing of JSON arrays.'''
+
+    def parse(self, text, block_size=3):
+        '''Helper function to parse text in (small) blocks.'''
+        return list(streaming.iter_array(make_stream(text), block_size))
+
+    def test_items(self):
+        '''Array elements are generated in order, whatever the block size.'''
+        document = [1, -2.5e3, 'spam', None, True, [], {'a': [1, {'b': 2}]}]
+        text = json.dumps(document, indent=2)
+        for block_size in (1, 2, 7, 1024):
+            self.assertEqual(document, self.parse(text, block_size))
+
+    def test_split_values(self):
+        '''Values split across blocks are not cut short.'''
+        self.assertEqual([12345, 'àèìòù', -6.7e+8],
+                         self.parse('[12345,"àèìòù",-6.7e+8]', 1))
+
+    def test_empty(self):
+        '''Empty arrays generate nothing.'''
+        self.assertEqual([], self.parse(' [ ] '))
+
+    def test_lazy(self):
+        '''The stream is read only as far as needed for the next element.'''
+        stream = make_stream('[1, 2, ' + ' ' * 100 + '3]')
+        items = streaming.iter_array(stream, 4)
+        self.assertEqual(1, next(items))
+        self.assertLess(stream.tell(), 10)
+
+    def test_malformed(self):
+        '''Malformed documents raise ValueError.'''
+        for text in ('', '{}', '[1 2]', '[1,]', '[1, 2', '[1] 2', '[tru]'):
+            with self.assertRaises(ValueError):
+                self.parse(text)
+
+    def test_invalid_utf8(self):
+        '''Invalid UTF-8 raises ValueError.'''
+        items = streaming.iter_array(io.BytesIO(b'["\xff"]'))
+        with self.assertRaises(ValueError):
+            list(items)
+
+    def test_long_values(self):
+        '''Values far longer than a block are parsed.'''
+        document = ['x' * 10000, list(range(1000))]
+        self.assertEqual(document, self.parse(json.dumps(document), 16))
+
+
+class TestIterNDJSON(unittest.TestCase):
+
+    '''Test the incremental parsing of newline-delimited JSON.'''
+
+    def test_items(self):
+        '''Documents are generated in order, blank lines are ignored.'''
+        text = '{"a": 1}\n[2]\n\n3\n"four"\n'
+        items = streaming.iter_ndjson(make_stream(text), 2)
+        self.assertEqual([{'a': 1}, [2], 3, 'four'], list(items))
+
+    def test_malformed(self):
+        '''Malformed documents raise ValueError.'''
+        items = streaming.iter_ndjson(make_stream('1\n{"a": \n'))
+        self.assertEqual(1, next(items))
+        with self.assertRaises(ValueError):
+            next(items)
+
+
+class TestStreamedBodies(unittest.TestCase):
+
+    '''Test the extraction of streamed body parameters.'''
+
+    def make_request(self, data, content_type='application/json'):
+        '''Helper function to build a request with a body.'''
+        builder = EnvironBuilder(data=data, method='POST',
+                                 content_type=content_type)
+        return Request(builder.get_environ())
+
+    def test_array(self):
+        '''Operations streaming their body get an iterator over the array.'''
+        points = [{'x': n, 'y': -n} for n in range(3)]
+        kwargs = {}
+        request = self.make_request(json.dumps(points))
+        ArgumentExtractor(dummy.streamed_func)(request, kwargs)
+        self.assertNotIsInstance(kwargs['points'], list)
+        self.assertEqual(points, list(kwargs['points']))
+
+    def test_ndjson(self):
+        '''NDJSON bodies are streamed one line at a time.'''
+        kwargs = {}
+        request = self.make_request('{"x": 1, "y": 2}\n{"x": 3, "y": 4}\n',
+                                    'application/x-ndjson')
+        ArgumentExtractor(dummy.streamed_func)(request, kwargs)
+        self.assertEqual([{'x': 1, 'y': 2}, {'x': 3, 'y': 4}],
+                         list(kwargs['points']))
+
+    def test_bad_request(self):
+        '''Malformed bodies raise BadRequest, once their error is reached.'''
+        kwargs = {}
+        request = self.make_request('[{"x": 1, "y": 2}, {"x": ]')
+        ArgumentExtractor(dummy.streamed_func)(request, kwargs)
+        self.assertEqual({'x': 1, 'y': 2}, next(kwargs['points']))
+        with self.assertRaises(BadRequest) as context_manager:
+            next(kwargs['points'])
+        self.assertIn('"points"', context_manager.exception.description)
+
+    def test_validate(self):
+        '''Items are validated against the items schema, if requested.'''
+        kwargs = {}
+        request = self.make_request('[{"x": 1, "y": 2}, {"x": "one"}]')
+        ArgumentExtractor(dummy.streamed_func, True)(request, kwargs)
+        self.assertEqual({'x': 1, 'y': 2}, next(kwargs['points']))
+        with self.assertRaises(BadRequest) as context_manager:
+            next(kwargs['points'])
+        self.assertIn('"/1"', context_manager.exception.description)
+
+    def test_no_process_pool(self):
+        '''Streamed bodies cannot be sent to a process pool.'''
+        def method(cls, request) -> [(200, 'Ok', Void)]:
+            pass
+        decorator = operations('POST', stream_body=True, executor='process')
+        with self.assertRaises(ValueError):
+            decorator(method)
@@ -4,7 +4,7 @@ import unittest
 
 from .. import testlib as tl
 from ..api import operations
-from ..flowcontrol import Respond
+from ..flowcontrol import Respond, Response
 
 
 class DummyResource(object):
@@ -18,6 +18,15 @@ class DummyResource(object):
             cls, request, foo, bar, spam) -> [(200, 'Ok')]:
         Respond(200, (x for x in (foo, bar, spam)))
 
+    @operations('GET', 'POST')
+    def dummy_return_endpoint(cls, request, foo, bar, spam) -> [(200, 'Ok')]:
+        yield
+        return Response(200, foo + bar + spam)
+
+    @operations('GET')
+    def dummy_silent_endpoint(cls, request) -> [(200, 'Ok')]:
+        yield
+
 
 class TestFunctions(unittest.TestCase):
 
@@ -37,3 +46,16 @@ class TestFunctions(unittest.TestCase):
         actual = tl.call_endpoint(
             DummyResource.dummy_generator_endpoint, **kwargs)
         self.assertEqual(expected, actual)
+
+    def test_call_endpoint_return(self):
+        '''test_enpoint bypasses wrapper implementation details (return).'''
+        kwargs = {'foo': 1, 'bar': 2, 'spam': 3}
+        expected = 6
+        actual = tl.call_endpoint(
+            DummyResource.dummy_return_endpoint, **kwargs)
+        self.assertEqual(expected, actual)
+
+    def test_call_endpoint_none(self):
+        '''test_enpoint returns None if the endpoint gives no response.'''
+        self.assertIsNone(
+            tl.call_endpoint(DummyResource.dummy_silent_endpoint))
@@ -1,9 +1,10 @@
 '''Test suite for the utils module.'''
 
+import json
 import inspect
 import unittest
 
-from werkzeug.exceptions import HTTPException, ImATeapot
+from werkzeug.exceptions import BadRequest, HTTPException, ImATeapot
 from werkzeug.test import EnvironBuilder
 from werkzeug.wrappers import Request
 
@@ -78,6 +79,33 @@ class MetaClasses(unittest.TestCase):
         self.assertEqual(expected, Model.name_to_cls['SillyModel'])
 
 
+class LRUCaching(unittest.TestCase):
+
+    '''Test the LRUCache class.'''
+
+    def test_eviction(self):
+        '''The least recently used item is evicted first.'''
+        cache = utils.LRUCache(2)
+        cache.put('foo', 1)
+        cache.put('bar', 2)
+        cache.get('foo')
+        cache.put('spam', 3)
+        self.assertIsNone(cache.get('bar'))
+        self.assertEqual(1, cache.get('foo'))
+        self.assertEqual(2, len(cache))
+
+    def test_stats(self):
+        '''Hits, misses and evictions are counted.'''
+        cache = utils.LRUCache(1)
+        cache.put('foo', 1)
+        cache.get('foo')
+        cache.get('bar')
+        cache.put('bar', 2)
+        expected = {'size': 1, 'maxsize': 1, 'hits': 1, 'misses': 1,
+                    'evictions': 1}
+        self.assertEqual(expected, cache.stats)
+
+
 class MapExceptions(unittest.TestCase):
 
     '''Tests the mapping of HTTP status code onto werkzeug classes.'''
@@ -191,17 +219,108 @@ class InjectArgs(unittest.TestCase):
         self.assertEqual(expected, wkargs)
 
 
+class ArgumentExtraction(unittest.TestCase):
+
+    '''Test the compiled extraction plans.'''
+
+    def test_path_only_plan(self):
+        '''Operations with only path parameters have an empty, falsy plan.'''
+        extractor = utils.ArgumentExtractor(dummy.path_func)
+        self.assertEqual((), extractor.steps)
+        self.assertFalse(extractor)
+
+    def test_steps_order(self):
+        '''Steps follow the signature order and record their source.'''
+        extractor = utils.ArgumentExtractor(dummy.path_var_function)
+        actual = [(name, source) for name, source, _, _ in extractor.steps]
+        expected = [('still_noise', 'body'), ('extra_noise', 'header')]
+        self.assertEqual(expected, actual)
+
+    def test_reuse(self):
+        '''The same plan can be run against different requests.'''
+        extractor = utils.ArgumentExtractor(dummy.query_func)
+        for value in ('foo', 'bar'):
+            builder = EnvironBuilder(path='/?var_one={}'.format(value))
+            request = Request(builder.get_environ())
+            wkargs = {}
+            extractor(request, wkargs)
+            self.assertEqual({'var_one': value}, wkargs)
+
+
+class Coercion(unittest.TestCase):
+
+    '''Test the coercion of parameters to their declared types.'''
+
+    def test_type_rule(self):
+        '''Typed path variables get the converter of their model.'''
+        rule = '/api/<day>/<name>/<string(length=2):count>'
+        expected = '/api/<date:day>/<name>/<string(length=2):count>'
+        self.assertEqual(expected, utils.type_rule(rule, dummy.typed_func))
+
+    def test_coerce(self):
+        '''Query and header values are coerced to their types.'''
+        builder = EnvironBuilder(path='/?count=3', headers={'verbose': 'on'})
+        request = Request(builder.get_environ())
+        wkargs = {}
+        utils.inject_extra_args(dummy.typed_func, request, wkargs)
+        self.assertEqual({'count': 3, 'verbose': True}, wkargs)
+
+    def test_bad_request(self):
+        '''Values that cannot be coerced or decoded are a bad request.'''
+        builder = EnvironBuilder(path='/?count=three')
+        request = Request(builder.get_environ())
+        with self.assertRaises(BadRequest):
+            utils.inject_extra_args(dummy.typed_func, request, {})
+        builder = EnvironBuilder(data='{"foo": ', method='POST')
+        request = Request(builder.get_environ())
+        with self.assertRaises(BadRequest):
+            utils.inject_extra_args(dummy.body_func, request, {})
+
+
+class Validation(unittest.TestCase):
+
+    '''Test the validation of bodies against their model.'''
+
+    def make_request(self, body):
+        '''Helper function to build a request with a JSON body.'''
+        builder = EnvironBuilder(data=json.dumps(body), method='POST')
+        return Request(builder.get_environ())
+
+    def test_validate(self):
+        '''Invalid bodies are a bad request, if validation is enabled.'''
+        extractor = utils.ArgumentExtractor(dummy.validated_func, True)
+        wkargs = {}
+        extractor(self.make_request({'x': 1, 'y': 2}), wkargs)
+        self.assertEqual({'point': {'x': 1, 'y': 2}}, wkargs)
+        with self.assertRaises(BadRequest) as context_manager:
+            extractor(self.make_request({'x': 'one', 'y': 2}), {})
+        self.assertIn('"/x"', context_manager.exception.description)
+
+    def test_disabled(self):
+        '''Bodies are not validated by default.'''
+        extractor = utils.ArgumentExtractor(dummy.validated_func)
+        wkargs = {}
+        extractor(self.make_request({'x': 'one'}), wkargs)
+        self.assertEqual({'point': {'x': 'one'}}, wkargs)
+
+
 class Jsonify(unittest.TestCase):
 
     '''Test the jsonify helper function.'''
 
     def test_return_expected(self):
-        '''jsonify return a sorted, indented JSON representation.'''
+        '''jsonify "pretty" return a sorted, indented JSON representation.'''
         payload = {'aaa': 'foo', 'bar': 'spam', 'foobar': 'BDFL'}
         expected = ('{\n    "aaa": "foo", '
                     '\n    "bar": "spam", '
                     '\n    "foobar": "BDFL"\n}')
-        self.assertEqual(expected, utils.jsonify(payload))
+        self.assertEqual(expected, utils.jsonify(payload, 'pretty'))
+
+    def test_compact_default(self):
+        '''jsonify defaults to a compact JSON representation.'''
+        payload = {'foo': [1, 2], 'bar': None}
+        self.assertNotIn(' ', utils.jsonify(payload))
+        self.assertEqual(payload, json.loads(utils.jsonify(payload)))
 
 
 class FilterAnnotations(unittest.TestCase):
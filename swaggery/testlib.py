@@ -11,15 +11,23 @@ def call_endpoint(endpoint, request=None, start_response=None, **kwargs):
 
     Notably, this utility function:
     - Creates arguments required by the wrapper "on the fly" (unless passed).
-    - Intercept the Win exception and extract the data from it.
+    - Intercept the Win exception (or the returned Response) and extract the
+      data from it.
     - Return an object or a list of objects, rather than a generator.
     '''
     request = request or mock.MagicMock()
     start_response = start_response or mock.MagicMock()
+    coroutine = endpoint(request, start_response, **kwargs)
     try:
-        list(endpoint(request, start_response, **kwargs))
+        while True:
+            next(coroutine)
+    except StopIteration as e:
+        result = e.value
     except Respond as e:
-        pl = e.payload
-        if isgenerator(pl):
-            return list(pl)
-        return pl
+        result = e
+    if result is None:  # The operation neither returned nor raised a response
+        return None
+    pl = result.payload
+    if isgenerator(pl):
+        return list(pl)
+    return pl
@@ -1,9 +1,30 @@
 '''A collection of utility for the Swaggery framework.'''
+import re
 import json
 import inspect
+from functools import partial
+from operator import attrgetter
+from collections import OrderedDict
 from textwrap import dedent
 
 import werkzeug.exceptions as exceptions
+from jsonschema.exceptions import best_match
+
+from .streaming import get_item_validator, stream_json
+
+# Available JSON encoders, by output profile.  Profile "fast" is available only
+# if the (optional) ujson library is installed.
+JSON_ENCODERS = {
+    'compact': partial(json.dumps, separators=(',', ':')),
+    'pretty': partial(json.dumps, indent=4, sort_keys=True),
+}
+try:
+    import ujson
+except ImportError:
+    pass
+else:
+    JSON_ENCODERS['fast'] = ujson.dumps
+DEFAULT_JSON_PROFILE = 'compact'
 
 
 class Enumerator(type):
@@ -95,6 +116,56 @@ class RegisterLeafModels(RegisterLeafClasses):
                 pass
 
 
+class LRUCache(object):
+
+    '''A size-bounded mapping that discards the least recently used items.
+
+    Hits, misses and evictions are counted, for tuning the size of the cache.
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        '''Return the value for key (marking it as recently used).'''
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''Store value under key, evicting the oldest items if needed.'''
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        '''Discard all the items (statistics are preserved).'''
+        self._data.clear()
+
+    @property
+    def stats(self):
+        '''Return a dictionary with the usage statistics of the cache.'''
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 def map_exception_codes():
     '''Helper function to intialise CODES_TO_EXCEPTIONS.'''
     werkex = inspect.getmembers(exceptions, lambda x: getattr(x, 'code', None))
@@ -141,6 +212,26 @@ def extract_pathvars(callback):
     return {'mandatory': mandatory, 'optional': optional}
 
 
+def type_rule(rule, callback):
+    '''Return the werkzeug rule, with converters for typed path variables.
+
+    Untyped variables (e.g.: "<limit>") annotated with a native Model having a
+    converter (e.g.: Integer) are rewritten (e.g.: "<integer:limit>"), so that
+    they are parsed while routing.  Explicit converters are left untouched.
+    '''
+    def replace(match):
+        name = match.group(1)
+        try:
+            param_type, model = callback.__annotations__[name]
+        except (KeyError, TypeError, ValueError):
+            return match.group(0)
+        converter = getattr(model, 'converter', None)
+        if param_type != Ptypes.path or converter is None:
+            return match.group(0)
+        return '<{}:{}>'.format(converter, name)
+    return re.sub(r'<(\w+)>', replace, rule)
+
+
 def parse_docstring(whatever_has_docstring):
     '''Parse a docstring into a semmary (first line) and notes (rest of it).'''
     try:
@@ -152,32 +243,129 @@ def parse_docstring(whatever_has_docstring):
     return summary, notes
 
 
+class ArgumentExtractor(object):
+
+    '''A compiled plan for extracting the extra arguments of an operation.
+
+    The plan is built once from the operation's annotations and consists of an
+    ordered tuple of (name, source, accessor, decoder) steps, where `source` is
+    the Ptype of the parameter, `accessor` fetches the raw value from the
+    request and `decoder` (if not None) converts it: bodies are decoded from
+    JSON (and, if `validate` is True, validated against the schema of their
+    Model), other values are coerced to their (native) Model type.  Values that
+    cannot be decoded raise BadRequest.  Operations declared with `stream_body`
+    get an iterator over the items of the body instead (see the `streaming`
+    module), which parses them lazily.  Path parameters are not part of the
+    plan, as they are parsed by werkzeug: an operation taking only path
+    parameters has an empty plan, which evaluates to False.
+    '''
+
+    def __init__(self, callback, validate=False):
+        self.steps = tuple(self._compile(callback, validate))
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def __call__(self, request, kwargs):
+        for name, _, accessor, decoder in self.steps:
+            value = accessor(request)
+            if value is None:
+                continue
+            if decoder is not None:
+                value = decoder(value)
+            kwargs[name] = value
+
+    @staticmethod
+    def _compile(callback, validate):
+        '''Generate the extraction steps, in signature order.'''
+        stream = getattr(callback, 'stream_body', False)
+        try:
+            signature = callback.signature
+        except AttributeError:  # Plain functions, not decorated operations
+            signature = inspect.signature(callback)
+        for pname in signature.parameters:
+            try:
+                param_type, model = callback.__annotations__[pname]
+            except KeyError:  # unannotated params, like "cls" or "request"
+                continue
+            if param_type == Ptypes.path:
+                continue  # Already parsed by werkzeug
+            attribute = PTYPE_TO_REQUEST_PROPERTY[param_type]
+            if param_type == Ptypes.body and stream:
+                validator = getattr(model, 'validator', None)
+                if validate and validator is not None:
+                    validator = get_item_validator(validator)
+                else:
+                    validator = None
+                accessor = partial(
+                    stream_json, name=pname, validator=validator)
+                yield pname, param_type, accessor, None
+            elif param_type == Ptypes.body:
+                # TODO: The JSON conversion should be dependant from request
+                # header type, really...
+                validator = getattr(model, 'validator', None)
+                if validate and validator is not None:
+                    decoder = partial(decode_valid_json, validator=validator)
+                else:
+                    decoder = decode_json
+                decoder = _make_decoder(decoder, pname)
+                yield pname, param_type, attrgetter(attribute), decoder
+            else:
+                coerce = getattr(model, 'coerce', None)
+                if coerce is not None:
+                    coerce = _make_decoder(coerce, pname)
+                getter = _make_getter(attribute, pname)
+                yield pname, param_type, getter, coerce
+
+
+def _make_getter(attribute, key):
+    '''Return a function fetching `key` from a mapping attribute of request.'''
+    get_mapping = attrgetter(attribute)
+
+    def getter(request):
+        return get_mapping(request).get(key, None)
+    return getter
+
+
+def _make_decoder(decode, name):
+    '''Return `decode`, raising BadRequest on the values it cannot decode.'''
+    def decoder(value):
+        try:
+            return decode(value)
+        except ValueError as e:
+            msg = 'Invalid value for parameter "{}": {}'
+            raise exceptions.BadRequest(msg.format(name, e))
+    return decoder
+
+
+def decode_json(value):
+    '''Decode a UTF-8 encoded JSON document.'''
+    return json.loads(value.decode('utf-8'))
+
+
+def decode_valid_json(value, validator):
+    '''Decode a UTF-8 encoded JSON document, and validate it.'''
+    document = decode_json(value)
+    error = best_match(validator.iter_errors(document))
+    if error is not None:
+        location = '/'.join(str(bit) for bit in error.path)
+        raise ValueError('{} (at "/{}")'.format(error.message, location))
+    return document
+
+
 def inject_extra_args(callback, request, kwargs):
-    '''Inject extra arguments from header, body, form.'''
-    # TODO: this is a temporary pach, should be managed via honouring the
-    # mimetype in the request header....
-    annots = dict(callback.__annotations__)
-    del annots['return']
-    for param_name, (param_type, _) in annots.items():
-        if param_type == Ptypes.path:
-            continue  # Already parsed by werkzeug
-        elif param_type == Ptypes.body:
-            value = getattr(request, PTYPE_TO_REQUEST_PROPERTY[param_type])
-            # TODO: The JSON conversion should be dependant from request
-            # header type, really...
-            value = json.loads(value.decode('utf-8'))
-        else:
-            get = lambda attr: getattr(request, attr).get(param_name, None)
-            value = get(PTYPE_TO_REQUEST_PROPERTY[param_type])
-        if value is not None:
-            kwargs[param_name] = value
+    '''Inject extra arguments from header, body, form.
+
+    This compiles the extraction plan on each call: the application compiles
+    it only once per operation (see `ArgumentExtractor`).'''
+    ArgumentExtractor(callback)(request, kwargs)
 
 
-def jsonify(payload):
+def jsonify(payload, profile=DEFAULT_JSON_PROFILE):
     '''A helper function to consistently format the output of the API.'''
     # This is a HOPEFULLY temporary fix, while waiting to properly honour the
     # consumes/produces fields of the API description
-    return json.dumps(payload, indent=4, sort_keys=True)
+    return JSON_ENCODERS[profile](payload)
 
 
 def filter_annotations_by_ptype(function, ptype):